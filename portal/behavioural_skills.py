@@ -0,0 +1,66 @@
+# portal/behavioural_skills.py
+"""
+Behavioural skill ratings, read and written a whole report (or class) at a time.
+
+Ratings live on GradeReport.behavioural_ratings, one digit per skill in
+BEHAVIOURAL_SKILLS order (see models.py), so reading them needs no join.
+Ratings for any number of reports load in one query and save in one
+``bulk_update``.
+"""
+
+from django.db import transaction
+from django.utils.text import slugify
+
+from .models import BEHAVIOURAL_SKILLS, SKILL_RATINGS, GradeReport
+
+SKILL_NAMES = BEHAVIOURAL_SKILLS
+RATINGS = list(SKILL_RATINGS)
+
+
+def skill_field_name(skill):
+    # Matches the templates' beh_{{ skill|slugify }} inputs
+    return f"beh_{slugify(skill)}"
+
+
+def parse_rating(value):
+    """The posted rating as an int, None when blank; ValueError when out of range."""
+    value = (value or '').strip()
+    if not value:
+        return None
+    rating = int(value)
+    if rating not in RATINGS:
+        raise ValueError(f"Rating must be between {RATINGS[0]} and {RATINGS[-1]}.")
+    return rating
+
+
+def save_ratings(ratings):
+    """
+    Merge ``[(report id, skill name, rating), ...]`` into the stored ratings.
+
+    The reports are locked and read in one query and written back in one
+    ``bulk_update``. Like any bulk write this skips post_save; report card
+    PDFs are cached by the content of the report row, so they still pick up
+    the change.
+    """
+    by_report = {}
+    for report_id, skill_name, rating in ratings:
+        by_report.setdefault(report_id, []).append((skill_name, rating))
+    if not by_report:
+        return 0
+
+    with transaction.atomic():
+        reports = list(GradeReport.objects.select_for_update().filter(id__in=by_report).only('id', 'behavioural_ratings'))
+        for report in reports:
+            report.set_ratings(by_report[report.id])
+        GradeReport.objects.bulk_update(reports, ['behavioural_ratings'], batch_size=500)
+    return sum(len(by_report[report.id]) for report in reports)
+
+
+def parse_ratings(post):
+    """``[(skill name, rating)]`` from a form's ``beh_<skill>`` inputs, skipping blanks."""
+    ratings = []
+    for skill in SKILL_NAMES:
+        rating = parse_rating(post.get(skill_field_name(skill)))
+        if rating is not None:
+            ratings.append((skill, rating))
+    return ratings
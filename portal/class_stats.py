@@ -0,0 +1,114 @@
+# portal/class_stats.py
+"""
+Per-subject statistics for one classroom's term.
+
+Counts, means, spreads, pass rates and grade histograms come from SQL
+aggregates over SubjectGrade; medians are picked by index from one ordered
+``values_list`` fetch. Manual letters outside A-F (e.g. "A+") are counted
+under "Other" and left out of the pass rate. Results are cached per classroom/session/term and
+dropped when a grade in that class changes (see signals.py).
+"""
+
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, Max, Min, Q, StdDev
+
+from .models import FAIL_GRADE, GRADE_BOUNDARIES, SubjectGrade
+
+CACHE_TIMEOUT = 60 * 60 * 24
+PASS_LETTERS = [letter for _, letter in GRADE_BOUNDARIES]
+GRADE_LETTERS = PASS_LETTERS + [FAIL_GRADE]
+OTHER_GRADE = 'Other'
+
+
+def stats_cache_key(classroom_id, session, term):
+    # Sessions and terms contain spaces and slashes, which memcached rejects
+    digest = hashlib.md5(f"{session}|{term}".encode('utf-8')).hexdigest()
+    return f"class_stats:{classroom_id}:{digest}"
+
+
+def invalidate_class_stats(classroom_id, session, term):
+    cache.delete(stats_cache_key(classroom_id, session, term))
+
+
+def _median(ordered, start, count):
+    middle = start + count // 2
+    if count % 2:
+        return ordered[middle]
+    return (ordered[middle - 1] + ordered[middle]) / 2
+
+
+def _pass_rate(row):
+    # Only grades with a known letter count as a pass or a fail
+    return round(100 * row['passes'] / row['graded'], 1) if row['graded'] else None
+
+
+def compute_class_stats(classroom_id, session, term):
+    """
+    Statistics for every subject taken in a classroom's term.
+
+    Four queries regardless of class size: per-subject aggregates, overall
+    aggregates, the grade histogram and the ordered totals for medians.
+    Returns a dict with ``subjects`` (one row per subject, sorted by name)
+    and ``overall`` for all subjects together.
+    """
+    grades = SubjectGrade.objects.filter(
+        report__classroom_id=classroom_id, report__session=session, report__term=term
+    ).with_grade()
+
+    aggregates = dict(
+        students=Count('report__student', distinct=True),
+        entries=Count('id'),
+        mean=Avg('total'),
+        std_dev=StdDev('total'),
+        lowest=Min('total'),
+        highest=Max('total'),
+        passes=Count('id', filter=Q(letter_grade__in=PASS_LETTERS)),
+        graded=Count('id', filter=Q(letter_grade__in=GRADE_LETTERS)),
+    )
+    subjects = list(grades.values('subject').annotate(**aggregates).order_by('subject'))
+    overall = grades.aggregate(**aggregates)
+
+    histogram = {}
+    for subject, letter, count in grades.values_list('subject', 'letter_grade').annotate(n=Count('id')).order_by():
+        letter = letter if letter in GRADE_LETTERS else OTHER_GRADE
+        counts = histogram.setdefault(subject, {})
+        counts[letter] = counts.get(letter, 0) + count
+    letters = list(GRADE_LETTERS)
+    if any(OTHER_GRADE in counts for counts in histogram.values()):
+        letters.append(OTHER_GRADE)
+
+    # One ordered fetch; each subject is a contiguous run whose length we
+    # already know from the aggregate above
+    totals = list(grades.order_by('subject', 'total').values_list('total', flat=True))
+
+    start = 0
+    for row in subjects:
+        row['median'] = _median(totals, start, row['entries'])
+        start += row['entries']
+        counts = histogram.get(row['subject'], {})
+        row['histogram'] = [(letter, counts.get(letter, 0)) for letter in letters]
+        row['pass_rate'] = _pass_rate(row)
+        row['mean'] = round(row['mean'], 2)
+        row['std_dev'] = round(row['std_dev'], 2)
+
+    if overall['entries']:
+        overall['median'] = _median(sorted(totals), 0, len(totals))
+        overall['histogram'] = [
+            (letter, sum(counts.get(letter, 0) for counts in histogram.values())) for letter in letters
+        ]
+        overall['pass_rate'] = _pass_rate(overall)
+        overall['mean'] = round(overall['mean'], 2)
+        overall['std_dev'] = round(overall['std_dev'], 2)
+
+    return {'subjects': subjects, 'overall': overall}
+
+
+def get_class_stats(classroom_id, session, term):
+    key = stats_cache_key(classroom_id, session, term)
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_class_stats(classroom_id, session, term)
+        cache.set(key, stats, CACHE_TIMEOUT)
+    return stats
@@ -0,0 +1,238 @@
+# portal/grade_import.py
+"""
+Bulk subject grade import from CSV or XLSX files.
+
+Every row is checked with SubjectGrade.clean(). Students, classrooms,
+reports and existing grades are each looked up with one query, and the
+whole file is written in one transaction with bulk_create/bulk_update. Any
+invalid row aborts the import, so a file is never half applied.
+"""
+
+import csv
+import io
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .class_stats import invalidate_class_stats
+from .models import User, Classroom, GradeReport, SubjectGrade
+from .rankings import compute_positions
+
+REQUIRED_COLUMNS = ['username', 'classroom', 'session', 'term', 'subject', 'first_test', 'second_test', 'exam']
+OPTIONAL_COLUMNS = ['manual_total', 'manual_grade', 'grade_comment']
+SCORE_COLUMNS = ['first_test', 'second_test', 'exam', 'manual_total']
+TEXT_COLUMNS = ['manual_grade', 'grade_comment']
+GRADE_FIELDS = SCORE_COLUMNS + TEXT_COLUMNS
+
+SESSIONS = {value for value, _ in GradeReport.SESSION_CHOICES}
+TERMS = {value for value, _ in GradeReport.TERM_CHOICES}
+
+
+class GradeImportError(Exception):
+    """The file itself can't be read (bad format, missing columns)."""
+
+
+@dataclass
+class ImportResult:
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    reports_created: int = 0
+    errors: list = field(default_factory=list)  # (row number, message)
+    dry_run: bool = False
+
+    @property
+    def ok(self):
+        return not self.errors
+
+
+def _read_csv(uploaded):
+    text = io.TextIOWrapper(uploaded, encoding='utf-8-sig', newline='')
+    try:
+        reader = csv.reader(text)
+        yield from reader
+    finally:
+        text.detach()
+
+
+def _read_xlsx(uploaded):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise GradeImportError("XLSX import needs the openpyxl package; upload a CSV file instead.")
+    workbook = load_workbook(uploaded, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield ['' if value is None else str(value) for value in row]
+    finally:
+        workbook.close()
+
+
+def read_rows(uploaded, filename):
+    """Yield ``(row number, {column: value})`` for each non-empty data row."""
+    if filename.lower().endswith('.xlsx'):
+        lines = _read_xlsx(uploaded)
+    elif filename.lower().endswith('.csv'):
+        lines = _read_csv(uploaded)
+    else:
+        raise GradeImportError("Upload a .csv or .xlsx file.")
+
+    try:
+        header = [column.strip().lower() for column in next(lines)]
+    except StopIteration:
+        raise GradeImportError("The file is empty.")
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        raise GradeImportError(f"Missing column(s): {', '.join(missing)}.")
+
+    for number, values in enumerate(lines, start=2):
+        values = list(values) + [''] * (len(header) - len(values))
+        row = {column: value.strip() for column, value in zip(header, values) if column}
+        if any(row.values()):
+            yield number, row
+
+
+def _parse_score(value, column):
+    # Blank scores count as 0, except manual_total where blank means "not set"
+    if value in ('', None):
+        return None if column == 'manual_total' else 0
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValidationError({column: f"'{value}' is not a number."})
+    if number != int(number):
+        raise ValidationError({column: f"'{value}' is not a whole number."})
+    return int(number)
+
+
+def _error_text(error):
+    if hasattr(error, 'message_dict'):
+        return '; '.join(message for messages in error.message_dict.values() for message in messages)
+    return '; '.join(error.messages)
+
+
+def import_grades(rows, dry_run=False):
+    """
+    Validate ``rows`` from ``read_rows`` and, unless ``dry_run``, save them.
+
+    Each row is a dict with username, classroom, session, term and subject
+    plus any of the score and comment columns. Existing grades are matched
+    on (student, classroom, session, term, subject) and updated; anything
+    else is created, along with any missing GradeReport. Report totals and
+    class positions are recomputed for every class touched.
+    """
+    rows = list(rows)
+    result = ImportResult(rows=len(rows), dry_run=dry_run)
+
+    students = {
+        user.username: user
+        for user in User.objects.filter(username__in={row.get('username') for _, row in rows}, role='student')
+    }
+    classrooms = {
+        room.name: room
+        for room in Classroom.objects.filter(name__in={row.get('classroom') for _, row in rows})
+    }
+
+    # Validate everything before touching the database
+    parsed = {}
+    for number, row in rows:
+        try:
+            student = students.get(row['username'])
+            if student is None:
+                raise ValidationError(f"Unknown student '{row['username']}'.")
+            classroom = classrooms.get(row['classroom'])
+            if classroom is None:
+                raise ValidationError(f"Unknown classroom '{row['classroom']}'.")
+            if row['session'] not in SESSIONS:
+                raise ValidationError(f"Unknown session '{row['session']}'.")
+            if row['term'] not in TERMS:
+                raise ValidationError(f"Unknown term '{row['term']}'.")
+            if not row['subject']:
+                raise ValidationError("Subject is required.")
+
+            # Only the columns given are written; the rest keep their values
+            values = {column: _parse_score(row[column], column) for column in SCORE_COLUMNS if column in row}
+            values.update({column: row[column] for column in TEXT_COLUMNS if column in row})
+            # Field checks (lengths, types) plus SubjectGrade.clean(); no queries
+            SubjectGrade(subject=row['subject'], **values).full_clean(exclude=['student', 'report'])
+        except ValidationError as error:
+            result.errors.append((number, _error_text(error)))
+            continue
+
+        key = (student.pk, classroom.pk, row['session'], row['term'], row['subject'])
+        if key in parsed:
+            result.errors.append((number, f"Duplicate of row {parsed[key][0]}."))
+            continue
+        parsed[key] = (number, student, values)
+
+    if not result.ok or not parsed:
+        return result
+
+    report_keys = {key[:4] for key in parsed}
+    classes = {key[1:] for key in report_keys}
+    # A superset of the reports we need: the classes and terms in the file
+    class_reports = GradeReport.objects.filter(
+        classroom_id__in={classroom_id for classroom_id, _, _ in classes},
+        session__in={session for _, session, _ in classes},
+        term__in={term for _, _, term in classes},
+    )
+
+    with transaction.atomic():
+        reports = {}
+        for report in class_reports.filter(student_id__in={key[0] for key in report_keys}).order_by('-id'):
+            key = (report.student_id, report.classroom_id, report.session, report.term)
+            if key in report_keys:
+                # Oldest report wins when the same term was created twice
+                reports[key] = report
+
+        now = timezone.localdate()
+        new_reports = [
+            GradeReport(student_id=key[0], classroom_id=key[1], session=key[2], term=key[3], date_uploaded=now)
+            for key in report_keys if key not in reports
+        ]
+        result.reports_created = len(new_reports)
+
+        existing = {}
+        if reports:
+            for grade in SubjectGrade.objects.filter(report__in=reports.values()):
+                existing.setdefault((grade.report_id, grade.subject), grade)
+
+        to_create, to_update, touched = [], [], set()
+        for key, (number, student, values) in parsed.items():
+            report = reports.get(key[:4])
+            grade = existing.get((report.pk, key[4])) if report else None
+            if grade is None:
+                to_create.append((key[:4], SubjectGrade(student=student, subject=key[4], **values)))
+            elif any(getattr(grade, name) != value for name, value in values.items()):
+                for name, value in values.items():
+                    setattr(grade, name, value)
+                to_update.append(grade)
+            else:
+                result.unchanged += 1
+                continue
+            touched.add(key[:4])
+        result.created = len(to_create)
+        result.updated = len(to_update)
+
+        if dry_run:
+            return result
+
+        for report in GradeReport.objects.bulk_create(new_reports, batch_size=500):
+            reports[(report.student_id, report.classroom_id, report.session, report.term)] = report
+        for report_key, grade in to_create:
+            grade.report = reports[report_key]
+        SubjectGrade.objects.bulk_create([grade for _, grade in to_create], batch_size=500)
+        update_fields = [name for name in GRADE_FIELDS if any(name in values for _, _, values in parsed.values())]
+        SubjectGrade.objects.bulk_update(to_update, update_fields, batch_size=500)
+        GradeReport.objects.filter(pk__in=[reports[key].pk for key in touched]).update(date_uploaded=now)
+
+        # bulk writes skip SubjectGrade.save() and the signals: recompute the
+        # classes' totals and positions and drop their cached statistics
+        compute_positions(class_reports)
+        for classroom_id, session, term in classes:
+            transaction.on_commit(lambda key=(classroom_id, session, term): invalidate_class_stats(*key), robust=True)
+
+    return result
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from portal.models import Timetable
+from portal.timetable_conflicts import find_clashes
+
+
+def describe(period):
+    teacher = (period.teacher.get_full_name() or period.teacher.username) if period.teacher else 'no teacher'
+    return f"{period.subject} ({period.classroom.name}, {teacher}) {period.start_time:%H:%M}–{period.end_time:%H:%M}"
+
+
+class Command(BaseCommand):
+    help = "List every period that double-books a classroom or a teacher."
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        periods = list(Timetable.objects.select_related('classroom', 'teacher'))
+        clashes = find_clashes(periods)
+        elapsed = time.perf_counter() - start
+
+        for clash in sorted(clashes, key=lambda c: (c.kind, c.day, c.first.start_time)):
+            self.stdout.write(f"{clash.kind.title()} clash on {clash.day}: {describe(clash.first)} / {describe(clash.second)}")
+        summary = f"Checked {len(periods)} period(s) in {elapsed * 1000:.1f}ms"
+        if clashes:
+            raise CommandError(f"{summary}: {len(clashes)} clash(es) found.")
+        self.stdout.write(self.style.SUCCESS(f"{summary}: no clashes."))
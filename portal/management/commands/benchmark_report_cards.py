@@ -0,0 +1,151 @@
+import json
+import math
+import platform
+import random
+import time
+import tracemalloc
+from datetime import date
+from io import BytesIO
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from portal.models import BEHAVIOURAL_SKILLS, User, Classroom, GradeReport, SubjectGrade
+from portal.report_cards import RENDERERS, build_student_profile, logo_data_uri, render_context_pdf
+
+SUBJECTS = [
+    'Mathematics', 'English Language', 'Basic Science', 'Basic Technology', 'Social Studies',
+    'Civic Education', 'Agricultural Science', 'Home Economics', 'Business Studies', 'Computer Studies',
+    'French', 'Yoruba', 'Igbo', 'Hausa', 'Christian Religious Studies',
+    'Islamic Religious Studies', 'Physical and Health Education', 'Cultural and Creative Arts', 'Music', 'Fine Art',
+    'Literature in English', 'Government', 'Economics', 'Geography', 'History',
+    'Biology', 'Chemistry', 'Physics', 'Further Mathematics', 'Technical Drawing',
+]
+
+
+def _percentile(samples, pct):
+    # Nearest-rank percentile, stable for small sample counts
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def synthetic_context(subject_count, rng):
+    """
+    A grades_pdf.html context built from unsaved model instances.
+
+    Nothing touches the database, so runs are repeatable on any machine and
+    never leave benchmark rows behind.
+    """
+    classroom = Classroom(name='JSS 2')
+    student = User(
+        username='bench.student', first_name='Bench', last_name='Student', role='student',
+        classroom=classroom, nationality='NIGERIA', gender='Female', height=150, weight=45,
+    )
+    report = GradeReport(
+        student=student, classroom=classroom, session='2024/2025', term='3rd Term',
+        date_uploaded=date(2025, 7, 18), next_term_date=date(2025, 9, 15),
+        total_available_score=subject_count * 100, overall_position='3rd',
+        teacher_comment='A diligent student who should keep working hard.',
+        admin_comment_report='Promoted to the next class.',
+    )
+    grades = []
+    for subject in SUBJECTS[:subject_count]:
+        grades.append(SubjectGrade(
+            student=student, report=report, subject=subject,
+            first_test=rng.randint(5, SubjectGrade.MAX_FIRST_TEST),
+            second_test=rng.randint(5, SubjectGrade.MAX_SECOND_TEST),
+            exam=rng.randint(20, SubjectGrade.MAX_EXAM),
+            first_term_score=rng.randint(40, 100), second_term_score=rng.randint(40, 100),
+            grade_comment='Good effort',
+        ))
+    for grade in grades:
+        grade.third_term_score = grade.total_score
+        grade.average_score = round((grade.first_term_score + grade.second_term_score + grade.third_term_score) / 3, 2)
+    report.overall_score = sum(grade.total_score for grade in grades)
+    report.overall_average = round(report.overall_score / subject_count, 2)
+    report.set_ratings((name, rng.randint(1, 5)) for name in BEHAVIOURAL_SKILLS)
+    return {
+        'grades': grades,
+        'report': report,
+        'student_name': student.get_full_name(),
+        'student_profile': build_student_profile(student, report),
+        'behavioural_skills': report.behavioural_skills,
+        'logo_url': logo_data_uri(),
+    }
+
+
+class Command(BaseCommand):
+    help = "Benchmark report card rendering on synthetic reports and print the results as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subjects', type=int, nargs='+', default=[5, 15, 30],
+                            help="Subject counts to benchmark (max %d)" % len(SUBJECTS))
+        parser.add_argument('--iterations', type=int, default=20, help="Timed renders per size")
+        parser.add_argument('--warmup', type=int, default=2, help="Untimed renders per size")
+        parser.add_argument('--renderer', choices=RENDERERS, default='xhtml2pdf')
+        parser.add_argument('--seed', type=int, default=1234, help="Seed for the synthetic scores")
+        parser.add_argument('--label', default='', help="Free-form tag stored with the run, e.g. a commit")
+        parser.add_argument('--output', help="Write the JSON here instead of stdout")
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError("--iterations must be at least 1.")
+        if min(options['subjects']) < 1:
+            raise CommandError("--subjects must all be at least 1.")
+        results = []
+        for subject_count in options['subjects']:
+            subject_count = min(subject_count, len(SUBJECTS))
+            context = synthetic_context(subject_count, random.Random(options['seed']))
+            results.append(self.measure(context, subject_count, options))
+
+        report = {
+            'benchmark': 'report_cards',
+            'schema': 1,
+            'label': options['label'],
+            'timestamp': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'renderer': options['renderer'],
+            'iterations': options['iterations'],
+            'warmup': options['warmup'],
+            'seed': options['seed'],
+            'results': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def measure(self, context, subject_count, options):
+        renderer = options['renderer']
+        for _ in range(options['warmup']):
+            render_context_pdf(context, renderer, BytesIO())
+
+        timings = []
+        for _ in range(options['iterations']):
+            start = time.perf_counter()
+            render_context_pdf(context, renderer, BytesIO())
+            timings.append((time.perf_counter() - start) * 1000)
+
+        # Separate run, tracemalloc would skew the timings
+        output = BytesIO()
+        tracemalloc.start()
+        try:
+            render_context_pdf(context, renderer, output)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'subjects': subject_count,
+            'p50_ms': round(_percentile(timings, 50), 3),
+            'p95_ms': round(_percentile(timings, 95), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'min_ms': round(min(timings), 3),
+            'max_ms': round(max(timings), 3),
+            'peak_memory_bytes': peak,
+            'output_bytes': len(output.getvalue()),
+        }
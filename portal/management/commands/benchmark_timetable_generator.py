@@ -0,0 +1,115 @@
+import json
+import platform
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from portal.timetable_generator import ATTEMPTS, MAX_BACKTRACKS, Requirement, TimetableGenerationError, solve
+from portal.timetables import DAYS
+
+# Weekly periods per subject, 35 of a 40-slot week
+SUBJECT_PERIODS = [
+    ('Mathematics', 5), ('English Language', 5), ('Basic Science', 4), ('Basic Technology', 4),
+    ('Social Studies', 3), ('Civic Education', 3), ('Agricultural Science', 3), ('Computer Studies', 2),
+    ('French', 2), ('Cultural and Creative Arts', 2), ('Physical and Health Education', 1), ('Music', 1),
+]
+
+
+def school_day(periods_per_day, minutes=40, first_period='08:00'):
+    start = datetime.strptime(first_period, '%H:%M')
+    times = [(start + timedelta(minutes=minutes * i)).time() for i in range(periods_per_day + 1)]
+    return [(day, times[i], times[i + 1]) for day in DAYS for i in range(periods_per_day)]
+
+
+def synthetic_school(classes, teachers, rng):
+    """
+    Requirements for ``classes`` classrooms sharing ``teachers`` teachers.
+
+    Each teacher takes one subject. Every subject gets a teacher, and the
+    rest go to whichever subject has the most periods per teacher. Every
+    class/subject pair goes to the least-loaded teacher of that subject, so
+    the load is realistic and even.
+    """
+    if teachers < len(SUBJECT_PERIODS):
+        raise ValueError(f"A synthetic school needs at least {len(SUBJECT_PERIODS)} teachers, one per subject.")
+    demand = {subject: periods * classes for subject, periods in SUBJECT_PERIODS}
+    staff = dict.fromkeys(demand, 1)
+    for _ in range(teachers - len(staff)):
+        busiest = max(staff, key=lambda subject: demand[subject] / staff[subject])
+        staff[busiest] += 1
+
+    next_id = iter(range(1, teachers + 1))
+    teacher_ids = {subject: [next(next_id) for _ in range(count)] for subject, count in staff.items()}
+    load = {}
+    requirements = []
+    for classroom_id in range(1, classes + 1):
+        for subject, periods in SUBJECT_PERIODS:
+            teacher_id = min(teacher_ids[subject], key=lambda t: (load.get(t, 0), rng.random()))
+            load[teacher_id] = load.get(teacher_id, 0) + periods
+            requirements.append(Requirement(classroom_id, subject, teacher_id, periods))
+    return requirements
+
+
+class Command(BaseCommand):
+    help = "Benchmark the timetable generator on a synthetic school and print the results as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--classes', type=int, default=40)
+        parser.add_argument('--teachers', type=int, default=60)
+        parser.add_argument('--periods-per-day', type=int, default=8)
+        parser.add_argument('--workers', type=int, default=1, help="Processes trying seeds in parallel")
+        parser.add_argument('--runs', type=int, default=3, help="Timed solves, each with a different seed")
+        parser.add_argument('--seed', type=int, default=1234, help="Seed for the synthetic school and first solve")
+        parser.add_argument('--attempts', type=int, default=ATTEMPTS)
+        parser.add_argument('--max-backtracks', type=int, default=MAX_BACKTRACKS)
+        parser.add_argument('--label', default='', help="Free-form tag stored with the run, e.g. a commit")
+        parser.add_argument('--output', help="Write the JSON here instead of stdout")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError("--workers must be at least 1.")
+        try:
+            requirements = synthetic_school(options['classes'], options['teachers'], random.Random(options['seed']))
+        except ValueError as e:
+            raise CommandError(str(e))
+        slot_days = [day for day, _, _ in school_day(options['periods_per_day'])]
+
+        timings = []
+        for run in range(options['runs']):
+            start = time.perf_counter()
+            try:
+                placed = solve(
+                    requirements, slot_days, seed=options['seed'] + run * options['attempts'],
+                    attempts=options['attempts'], max_backtracks=options['max_backtracks'], workers=options['workers'],
+                )
+            except TimetableGenerationError as e:
+                raise CommandError(str(e))
+            timings.append((time.perf_counter() - start) * 1000)
+
+        report = {
+            'benchmark': 'timetable_generator',
+            'schema': 1,
+            'label': options['label'],
+            'timestamp': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'classes': options['classes'],
+            'teachers': options['teachers'],
+            'slots': len(slot_days),
+            'periods': sum(len(slots) for slots in placed),
+            'workers': options['workers'],
+            'seed': options['seed'],
+            'runs': options['runs'],
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'min_ms': round(min(timings), 3),
+            'max_ms': round(max(timings), 3),
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
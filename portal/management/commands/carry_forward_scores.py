@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from portal.models import Classroom
+from portal.term_scores import carry_forward_scores
+
+
+class Command(BaseCommand):
+    help = "Fill each subject's 1st/2nd/3rd term scores and average from the session's earlier reports."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--session', required=True, help="Session, e.g. '2024/2025'")
+        parser.add_argument('--classroom', help="Only this classroom, e.g. 'JSS 1' (defaults to every class)")
+
+    def handle(self, *args, **options):
+        classroom = None
+        if options['classroom']:
+            try:
+                classroom = Classroom.objects.get(name=options['classroom'])
+            except Classroom.DoesNotExist:
+                raise CommandError(f"Classroom '{options['classroom']}' does not exist.")
+
+        updated = carry_forward_scores(options['session'], classroom)
+        self.stdout.write(self.style.SUCCESS(f"Updated {updated} subject grade(s)."))
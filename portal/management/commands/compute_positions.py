@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from portal.models import GradeReport
+from portal.rankings import compute_positions
+
+
+class Command(BaseCommand):
+    help = "Recompute report totals, averages and class positions from the subject grades."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--classroom', help="Only this classroom, e.g. 'JSS 1'")
+        parser.add_argument('--session', help="Only this session, e.g. '2024/2025'")
+        parser.add_argument('--term', help="Only this term, e.g. '1st Term'")
+
+    def handle(self, *args, **options):
+        reports = GradeReport.objects.all()
+        if options['classroom']:
+            reports = reports.filter(classroom__name=options['classroom'])
+        if options['session']:
+            reports = reports.filter(session=options['session'])
+        if options['term']:
+            reports = reports.filter(term=options['term'])
+
+        start = time.perf_counter()
+        changed = compute_positions(reports)
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated {changed} report(s) in {time.perf_counter() - start:.2f}s."
+        ))
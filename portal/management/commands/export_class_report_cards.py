@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from portal.models import Classroom
+from portal.report_cards import RENDERERS, render_class_report_cards, iter_report_zip
+
+
+class Command(BaseCommand):
+    help = "Render every report card for a classroom, session and term into one ZIP file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--classroom', required=True, help="Classroom name, e.g. 'JSS 1'")
+        parser.add_argument('--session', required=True, help="Session, e.g. '2024/2025'")
+        parser.add_argument('--term', required=True, help="Term, e.g. '1st Term'")
+        parser.add_argument('--output', required=True, help="Path of the ZIP file to write")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Number of render processes (defaults to the CPU count)")
+        parser.add_argument('--renderer', choices=RENDERERS, default=None,
+                            help="PDF backend (defaults to settings.REPORT_CARD_RENDERER)")
+
+    def handle(self, *args, **options):
+        try:
+            classroom = Classroom.objects.get(name=options['classroom'])
+        except Classroom.DoesNotExist:
+            raise CommandError(f"Classroom '{options['classroom']}' does not exist.")
+
+        rendered = []
+        failures = []
+
+        def track(results):
+            for filename, pdf, error in results:
+                if error:
+                    failures.append((filename, error))
+                else:
+                    rendered.append(filename)
+                yield filename, pdf, error
+
+        results = render_class_report_cards(
+            classroom, options['session'], options['term'],
+            max_workers=options['workers'], renderer=options['renderer'],
+        )
+        with open(options['output'], 'wb') as output:
+            for chunk in iter_report_zip(track(results)):
+                output.write(chunk)
+
+        for filename, error in failures:
+            self.stderr.write(f"Failed: {filename}: {error}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(rendered)} report card(s) to {options['output']} ({len(failures)} failed)."
+        ))
@@ -0,0 +1,91 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_time
+
+from portal.models import Classroom, User
+from portal.timetable_generator import (
+    ATTEMPTS, Requirement, TimetableGenerationError, generate_timetable, replace_timetables
+)
+from portal.timetables import DAYS
+
+# A spec lists the school day's slots (repeated on every day, Monday to
+# Friday unless "days" says otherwise) and each classroom's weekly lessons:
+#
+# {
+#   "slots": [["08:00", "08:40"], ["08:40", "09:20"], ["09:40", "10:20"]],
+#   "classes": {
+#     "JSS 1": [{"subject": "Mathematics", "teacher": "mrs.ade", "periods": 5}]
+#   }
+# }
+
+
+def read_spec(path):
+    """``(requirements by classroom name and username, slots)`` from a JSON spec file."""
+    try:
+        with open(path) as f:
+            spec = json.load(f)
+        days = spec.get('days', DAYS)
+        times = [(parse_time(start), parse_time(end)) for start, end in spec['slots']]
+        classes = {
+            name: [(lesson['subject'], lesson['teacher'], int(lesson['periods'])) for lesson in lessons]
+            for name, lessons in spec['classes'].items()
+        }
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        raise CommandError(f"Can't read {path}: {e}")
+    if any(start is None or end is None or start >= end for start, end in times):
+        raise CommandError("Every slot needs a start time before its end time, e.g. [\"08:00\", \"08:40\"].")
+    # bulk_create skips Timetable.clean(), so overlapping slots would save clashing periods
+    ordered = sorted(times)
+    for (_, end), (start, _) in zip(ordered, ordered[1:]):
+        if start < end:
+            raise CommandError(f"Slots overlap: one ends at {end:%H:%M} after the next starts at {start:%H:%M}.")
+    unknown = [day for day in days if day not in DAYS]
+    if unknown or len(set(days)) != len(days):
+        raise CommandError(f"\"days\" must list distinct days from {', '.join(DAYS)}.")
+    return classes, [(day, start, end) for day in days for start, end in times]
+
+
+class Command(BaseCommand):
+    help = "Generate clash-free timetables for the classrooms in a JSON spec, replacing their current periods."
+
+    def add_arguments(self, parser):
+        parser.add_argument('spec', help="Path to the JSON spec")
+        parser.add_argument('--workers', type=int, default=1, help="Processes trying seeds in parallel")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--attempts', type=int, default=ATTEMPTS)
+        parser.add_argument('--dry-run', action='store_true', help="Solve and report without saving")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError("--workers must be at least 1.")
+        classes, slots = read_spec(options['spec'])
+
+        classrooms = dict(Classroom.objects.filter(name__in=classes).values_list('name', 'id'))
+        usernames = {username for lessons in classes.values() for _, username, _ in lessons}
+        teachers = dict(User.objects.filter(username__in=usernames, role='teacher').values_list('username', 'id'))
+        missing = sorted(set(classes) - set(classrooms)) + sorted(usernames - set(teachers))
+        if missing:
+            raise CommandError(f"Unknown classroom(s) or teacher(s): {', '.join(missing)}")
+
+        requirements = [
+            Requirement(classrooms[name], subject, teachers[username], periods)
+            for name, lessons in classes.items()
+            for subject, username, periods in lessons
+        ]
+        start = time.perf_counter()
+        try:
+            periods = generate_timetable(
+                requirements, slots, seed=options['seed'], attempts=options['attempts'], workers=options['workers'],
+            )
+        except TimetableGenerationError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - start
+
+        summary = f"{len(periods)} period(s) for {len(classrooms)} classroom(s), solved in {elapsed:.2f}s"
+        if options['dry_run']:
+            self.stdout.write(f"Dry run: {summary}. Nothing saved.")
+            return
+        replace_timetables(periods, classrooms.values())
+        self.stdout.write(self.style.SUCCESS(f"Saved {summary}."))
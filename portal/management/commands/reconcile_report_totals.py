@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from portal.models import GradeReport
+from portal.rankings import compute_positions, reconcile_report_totals
+
+
+class Command(BaseCommand):
+    help = "Rebuild every report's stored totals and averages from its subject grades."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--positions', action='store_true',
+                            help="Recompute class positions as well")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        changed = reconcile_report_totals()
+        self.stdout.write(f"Reconciled totals: {changed} report(s) were out of date.")
+        if options['positions']:
+            changed = compute_positions(GradeReport.objects.all())
+            self.stdout.write(f"Recomputed positions: {changed} report(s) changed.")
+        self.stdout.write(self.style.SUCCESS(f"Done in {time.perf_counter() - start:.2f}s."))
@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from portal.models import ReportJob
+from portal.report_jobs import claim_next_job, run_job, requeue_interrupted_jobs
+
+
+# Seconds between checks for jobs a dead worker left running
+REQUEUE_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = "Render queued report card PDFs outside the web workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Seconds to wait between checks when the queue is empty")
+        parser.add_argument('--once', action='store_true',
+                            help="Drain the queue and exit instead of polling forever")
+
+    def requeue(self):
+        requeued = requeue_interrupted_jobs()
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} interrupted job(s).")
+        return time.monotonic()
+
+    def handle(self, *args, **options):
+        last_requeue = self.requeue()
+
+        while True:
+            # Long-lived process: drop connections the database has timed out
+            close_old_connections()
+            # A worker that died after this one started leaves its jobs running
+            if time.monotonic() - last_requeue > REQUEUE_INTERVAL:
+                last_requeue = self.requeue()
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            run_job(job)
+            if job.status == ReportJob.DONE:
+                self.stdout.write(self.style.SUCCESS(f"Job {job.id}: {job.file_name}"))
+            else:
+                self.stderr.write(f"Job {job.id} failed: {job.error}")
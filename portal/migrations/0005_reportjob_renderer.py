@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0004_subjectgrade_third_term_score_reportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportjob',
+            name='renderer',
+            field=models.CharField(default='xhtml2pdf', max_length=20),
+        ),
+    ]
@@ -0,0 +1,48 @@
+from django.db import migrations
+from django.db.models import Avg, Count, F, Sum
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 500
+TOTAL_FIELDS = ['total_available_score', 'overall_score', 'overall_average']
+
+
+def recompute_report_totals(apps, schema_editor):
+    # Totals used to be typed in by hand; start the incremental updates from
+    # numbers that match the subject grades
+    GradeReport = apps.get_model('portal', 'GradeReport')
+    subject_total = Coalesce(
+        F('subject_grades__manual_total'),
+        F('subject_grades__first_test') + F('subject_grades__second_test') + F('subject_grades__exam'),
+    )
+    # Reports without subject grades only have the hand-typed totals, and
+    # there's nothing to recompute them from, so they are left alone
+    reports = GradeReport.objects.annotate(
+        subject_total=Sum(subject_total),
+        subject_count=Count('subject_grades'),
+        subject_average=Avg(subject_total),
+    ).filter(subject_count__gt=0).order_by('pk')
+
+    batch = []
+    for report in reports.iterator(chunk_size=BATCH_SIZE):
+        report.total_available_score = report.subject_count * 100
+        report.overall_score = report.subject_total or 0
+        report.overall_average = None if report.subject_average is None else round(report.subject_average, 2)
+        batch.append(report)
+        if len(batch) == BATCH_SIZE:
+            GradeReport.objects.bulk_update(batch, TOTAL_FIELDS)
+            batch = []
+    if batch:
+        GradeReport.objects.bulk_update(batch, TOTAL_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0005_reportjob_renderer'),
+    ]
+
+    operations = [
+        # The hand-typed totals this replaces aren't kept, so reversing leaves
+        # the recomputed ones in place
+        migrations.RunPython(recompute_report_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0006_recompute_report_totals'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='behaviouralskill',
+            name='skill_name',
+            field=models.CharField(choices=[('Punctuality', 'Punctuality'), ('Neatness', 'Neatness'), ('Attentiveness', 'Attentiveness'), ('Social Development', 'Social Development'), ('Assignment', 'Assignment'), ('Class Participation', 'Class Participation'), ('Perseverance', 'Perseverance'), ('Responsibility', 'Responsibility'), ('Politeness', 'Politeness'), ('Honesty', 'Honesty'), ('Sport & Games', 'Sport & Games'), ('Industry', 'Industry'), ('Club Participation', 'Club Participation'), ('Psychomotor', 'Psychomotor')], max_length=50),
+        ),
+    ]
@@ -0,0 +1,66 @@
+import django.core.validators
+from django.db import migrations, models
+
+# Slot order as of this migration; later additions only ever append
+SKILLS = [
+    'Punctuality', 'Neatness', 'Attentiveness', 'Social Development', 'Assignment',
+    'Class Participation', 'Perseverance', 'Responsibility', 'Politeness', 'Honesty',
+    'Sport & Games', 'Industry', 'Club Participation', 'Psychomotor',
+]
+
+
+def pack_ratings(apps, schema_editor):
+    GradeReport = apps.get_model('portal', 'GradeReport')
+    BehaviouralSkill = apps.get_model('portal', 'BehaviouralSkill')
+
+    digits = {}
+    for report_id, skill_name, rating in BehaviouralSkill.objects.values_list('report_id', 'skill_name', 'rating').iterator():
+        # Names outside the list and out-of-range ratings were never valid choices
+        if skill_name in SKILLS and 1 <= rating <= 5:
+            digits.setdefault(report_id, ['0'] * len(SKILLS))[SKILLS.index(skill_name)] = str(rating)
+
+    reports = [
+        GradeReport(pk=report_id, behavioural_ratings=''.join(slots).rstrip('0'))
+        for report_id, slots in digits.items()
+    ]
+    GradeReport.objects.bulk_update(reports, ['behavioural_ratings'], batch_size=500)
+
+
+def unpack_ratings(apps, schema_editor):
+    GradeReport = apps.get_model('portal', 'GradeReport')
+    BehaviouralSkill = apps.get_model('portal', 'BehaviouralSkill')
+
+    rows = []
+    for report_id, student_id, packed in GradeReport.objects.exclude(
+        behavioural_ratings=''
+    ).exclude(student=None).values_list('id', 'student_id', 'behavioural_ratings').iterator():
+        rows.extend(
+            BehaviouralSkill(report_id=report_id, student_id=student_id, skill_name=skill, rating=int(digit))
+            for skill, digit in zip(SKILLS, packed) if digit != '0'
+        )
+    BehaviouralSkill.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0007_behaviouralskill_industry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gradereport',
+            name='behavioural_ratings',
+            field=models.CharField(blank=True, default='', max_length=32, validators=[django.core.validators.RegexValidator('^[0-5]*$', 'Behavioural ratings are packed digits from 0 to 5.')]),
+        ),
+        migrations.RunPython(pack_ratings, unpack_ratings),
+        # Keeping BehaviouralSkill alongside the packed field would mean two
+        # copies of every rating for the forms, the class matrix and the
+        # bulk writes to keep in step, and the table would keep growing. The
+        # packed field is the only store from here on. Migrating back to 0007
+        # rebuilds the rows from it, so the compact form stays optional per
+        # deployment.
+        migrations.DeleteModel(
+            name='BehaviouralSkill',
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0008_pack_behavioural_ratings'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['student', '-submitted_at', '-id'], name='submission_student_recent'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0010_submission_assignment_recent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='timetable',
+            index=models.Index(fields=['classroom', 'day', 'start_time'], name='timetable_classroom_day'),
+        ),
+        migrations.AddIndex(
+            model_name='timetable',
+            index=models.Index(fields=['teacher', 'day', 'start_time'], name='timetable_teacher_day'),
+        ),
+    ]
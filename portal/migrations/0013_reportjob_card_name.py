@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:51
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fail_duplicate_jobs(apps, schema_editor):
+    # Racing requests could queue the same card twice; keep the oldest so
+    # the constraint below can be added
+    ReportJob = apps.get_model('portal', 'ReportJob')
+    seen = set()
+    duplicates = []
+    for job in ReportJob.objects.filter(status__in=['pending', 'running']).order_by('created_at', 'id'):
+        key = (job.student_id, job.kind, job.renderer)
+        if key in seen:
+            duplicates.append(job.pk)
+        seen.add(key)
+    ReportJob.objects.filter(pk__in=duplicates).update(
+        status='failed', error='Duplicate of an earlier job for the same report card.', finished_at=timezone.now(),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0012_create_cache_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportjob',
+            name='card_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.RunPython(fail_duplicate_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='reportjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'running'])), fields=('student', 'kind', 'renderer', 'card_name'), name='unique_active_report_job'),
+        ),
+    ]
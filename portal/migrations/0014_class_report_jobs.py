@@ -0,0 +1,44 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0013_reportjob_card_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportjob',
+            name='classroom',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='portal.classroom'),
+        ),
+        migrations.AddField(
+            model_name='reportjob',
+            name='session',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='reportjob',
+            name='term',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='reportjob',
+            name='kind',
+            field=models.CharField(choices=[('latest', 'Latest report'), ('all', 'All reports'), ('class', 'Class report cards')], default='latest', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='reportjob',
+            name='student',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='report_jobs', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='reportjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind', 'class'), ('status__in', ['pending', 'running'])), fields=('card_name',), name='unique_active_class_report_job'),
+        ),
+    ]
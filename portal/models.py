@@ -1,8 +1,14 @@
 from django.contrib.auth.models import AbstractUser, BaseUserManager
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, CharField, DecimalField, F, FloatField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Cast, Coalesce, Round, Upper
+from django.db.models.lookups import GreaterThan
 from django.utils import timezone
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.core.validators import RegexValidator
+from collections import namedtuple
+import datetime
 
 # 🏫 Classroom Model
 class Classroom(models.Model):
@@ -92,6 +98,15 @@ class RegistrationCode(models.Model):
 
 
 # 📅 Timetable
+class TimetableQuerySet(models.QuerySet):
+    def overlapping(self, day, start_time, end_time):
+        """
+        Periods on ``day`` that share any time with ``start_time``–``end_time``.
+        Back-to-back periods (one ends as the other starts) don't overlap.
+        """
+        return self.filter(day=day, start_time__lt=end_time, end_time__gt=start_time)
+
+
 class Timetable(models.Model):
     classroom = models.ForeignKey(Classroom, on_delete=models.CASCADE, default=1)
     teacher = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role': 'teacher'}, null=True, blank=True, related_name='teacher_timetables')
@@ -100,9 +115,53 @@ class Timetable(models.Model):
     start_time = models.TimeField()
     end_time = models.TimeField()
 
+    objects = TimetableQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['classroom', 'day', 'start_time'], name='timetable_classroom_day'),
+            models.Index(fields=['teacher', 'day', 'start_time'], name='timetable_teacher_day'),
+        ]
+
     def __str__(self):
         return f"{self.subject} - {self.day} ({self.classroom.name})"
 
+    def clashes(self):
+        """Other periods that double-book this period's classroom or teacher."""
+        owners = Q(classroom_id=self.classroom_id)
+        if self.teacher_id is not None:
+            owners |= Q(teacher_id=self.teacher_id)
+        return (
+            Timetable.objects.overlapping(self.day, self.start_time, self.end_time)
+            .filter(owners).exclude(pk=self.pk)
+            .select_related('classroom', 'teacher').order_by('start_time')
+        )
+
+    def clean(self):
+        # Times that failed to parse are already reported by clean_fields()
+        if not isinstance(self.start_time, datetime.time) or not isinstance(self.end_time, datetime.time):
+            return
+        if self.start_time >= self.end_time:
+            raise ValidationError({'end_time': 'A period must end after it starts.'})
+
+        errors = []
+        for other in self.clashes():
+            slot = f"{other.start_time:%H:%M}–{other.end_time:%H:%M} on {other.day}"
+            if other.classroom_id == self.classroom_id:
+                errors.append(f"{other.classroom.name} already has {other.subject} at {slot}.")
+            if self.teacher_id is not None and other.teacher_id == self.teacher_id:
+                teacher = other.teacher.get_full_name() or other.teacher.username
+                errors.append(f"{teacher} already teaches {other.subject} to {other.classroom.name} at {slot}.")
+        if errors:
+            raise ValidationError(errors)
+
+    # 🗓️ Moving a period to another class changes both classes' grids
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_classroom_id = instance.__dict__.get('classroom_id')
+        return instance
+
 
 # 📝 Assignment
 class Assignment(models.Model):
@@ -119,6 +178,40 @@ class Assignment(models.Model):
 
 
 # 📤 Submission
+PASS_PERCENTAGE = 50
+
+
+class SubmissionQuerySet(models.QuerySet):
+    def with_grades(self):
+        """
+        Annotate each submission with its Grade's ``grade_score``,
+        ``grade_total`` and ``grade_feedback``, plus ``percentage`` and
+        ``pass_fail`` worked out in the same query. All None until graded.
+        """
+        grade = Grade.objects.filter(
+            student=OuterRef('student'), assignment=OuterRef('assignment')
+        ).order_by('-graded_on', '-id')
+        percentage = Cast(F('grade_score'), FloatField()) * Value(100.0) / F('grade_total')
+        return self.annotate(
+            grade_score=Subquery(grade.values('score')[:1]),
+            grade_total=Subquery(grade.values('total_marks')[:1]),
+            grade_feedback=Subquery(grade.values('feedback')[:1]),
+        ).annotate(
+            percentage=Case(
+                When(grade_total__gt=0, then=Round(Cast(percentage, DecimalField(max_digits=12, decimal_places=4)), 2)),
+                default=None,
+                output_field=FloatField(),
+            ),
+        ).annotate(
+            pass_fail=Case(
+                When(percentage__gte=PASS_PERCENTAGE, then=Value('Pass')),
+                When(percentage__lt=PASS_PERCENTAGE, then=Value('Fail')),
+                default=None,
+                output_field=CharField(),
+            ),
+        )
+
+
 class Submission(models.Model):
     student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE)
@@ -130,6 +223,15 @@ class Submission(models.Model):
     score = models.FloatField(null=True, blank=True)
     total_marks = models.FloatField(null=True, blank=True)
 
+    objects = SubmissionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Newest-first history pages (see pagination.py)
+            models.Index(fields=['student', '-submitted_at', '-id'], name='submission_student_recent'),
+            models.Index(fields=['assignment', '-submitted_at', '-id'], name='submission_assignment_recent'),
+        ]
+
     def __str__(self):
         return f"{self.student.username} - {self.assignment.title}"
 
@@ -189,6 +291,52 @@ class Teacher(models.Model):
     def __str__(self):
         return self.user.get_full_name()
 
+# 🎯 Behavioural skills, stored one digit per skill on GradeReport
+# The position in this list is the skill's storage slot: only ever append
+BEHAVIOURAL_SKILLS = [
+    'Punctuality',
+    'Neatness',
+    'Attentiveness',
+    'Social Development',
+    'Assignment',
+    'Class Participation',
+    'Perseverance',
+    'Responsibility',
+    'Politeness',
+    'Honesty',
+    'Sport & Games',
+    'Industry',
+    'Club Participation',
+    'Psychomotor',
+]
+SKILL_RATINGS = range(1, 6)
+UNRATED = '0'
+
+SkillRating = namedtuple('SkillRating', ['skill_name', 'rating'])
+
+
+def unpack_ratings(packed):
+    """``{skill: rating}`` in slot order for the rated skills in ``packed``."""
+    return {
+        skill: int(digit)
+        for skill, digit in zip(BEHAVIOURAL_SKILLS, packed or '')
+        if digit != UNRATED
+    }
+
+
+def pack_ratings(ratings):
+    """The packed digit string for ``{skill: rating}``; ValueError on bad input."""
+    digits = [UNRATED] * len(BEHAVIOURAL_SKILLS)
+    for skill, rating in ratings.items():
+        if skill not in BEHAVIOURAL_SKILLS:
+            raise ValueError(f"Unknown behavioural skill '{skill}'.")
+        if rating not in SKILL_RATINGS:
+            raise ValueError(f"Rating must be between {SKILL_RATINGS[0]} and {SKILL_RATINGS[-1]}.")
+        digits[BEHAVIOURAL_SKILLS.index(skill)] = str(rating)
+    # Trailing unrated slots are dropped, so skills added later need no migration
+    return ''.join(digits).rstrip(UNRATED)
+
+
 class GradeReport(models.Model):
     SESSION_CHOICES = [
         ('2023/2024', '2023/2024'),
@@ -221,14 +369,95 @@ class GradeReport(models.Model):
     admin_comment_report = models.TextField(blank=True)
     next_term_date = models.DateField(null=True, blank=True)
 
+    behavioural_ratings = models.CharField(
+        max_length=32,
+        blank=True,
+        default='',
+        validators=[RegexValidator(r'^[0-5]*$', 'Behavioural ratings are packed digits from 0 to 5.')],
+    )
+
     def __str__(self):
         return f"{self.student.username if self.student else 'Unknown Student'} - {self.term} {self.session}"
 
+    # 🎯 Behavioural skills, read straight off the report
+    @property
+    def ratings(self):
+        return unpack_ratings(self.behavioural_ratings)
+
+    @property
+    def behavioural_skills(self):
+        return [SkillRating(skill, rating) for skill, rating in self.ratings.items()]
+
+    def set_ratings(self, ratings):
+        """Merge ``(skill, rating)`` pairs into the stored ratings (not saved)."""
+        self.behavioural_ratings = pack_ratings({**self.ratings, **dict(ratings)})
+
+    # Kept by SubjectGrade with F() updates (see apply_report_total_change)
+    TOTAL_FIELDS = ('total_available_score', 'overall_score', 'overall_average')
+
+    def save(self, *args, **kwargs):
+        # An instance loaded before its grades changed holds stale totals, so
+        # a plain save of an existing report leaves them to the database
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.TOTAL_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
+def apply_report_total_change(report_id, score_delta, count_delta):
+    """
+    Shift a report's stored totals by one SubjectGrade change, in one UPDATE.
+
+    The average is derived from the new score and available score inside
+    the same statement, so concurrent edits to one report can't interleave.
+    """
+    score = Coalesce(F('overall_score'), Value(0)) + Value(score_delta)
+    available = Coalesce(F('total_available_score'), Value(0)) + Value(count_delta * SubjectGrade.MAX_TOTAL)
+    average = Cast(score, FloatField()) * Value(100.0) / Cast(available, FloatField())
+    GradeReport.objects.filter(pk=report_id).update(
+        overall_score=score,
+        total_available_score=available,
+        overall_average=Case(
+            When(GreaterThan(available, 0), then=Round(Cast(average, DecimalField(max_digits=12, decimal_places=4)), 2)),
+            default=None,
+            output_field=FloatField(),
+        ),
+    )
+
+
+# Letter grades by minimum total, best first; anything lower is an F
+GRADE_BOUNDARIES = [(70, 'A'), (60, 'B'), (50, 'C'), (45, 'D')]
+FAIL_GRADE = 'F'
+
+
+class SubjectGradeQuerySet(models.QuerySet):
+    def with_totals(self):
+        """Annotate ``total``: ``manual_total`` when set, else tests plus exam."""
+        return self.annotate(
+            total=Coalesce(F('manual_total'), F('first_test') + F('second_test') + F('exam'))
+        )
+
+    def with_grade(self):
+        """Annotate ``total`` and ``letter_grade``, matching ``SubjectGrade.grade``."""
+        qs = self if 'total' in self.query.annotations else self.with_totals()
+        return qs.annotate(
+            letter_grade=Case(
+                When(~Q(manual_grade=''), then=Upper('manual_grade')),
+                *[When(total__gte=minimum, then=Value(letter)) for minimum, letter in GRADE_BOUNDARIES],
+                default=Value(FAIL_GRADE),
+                output_field=models.CharField(),
+            )
+        )
+
 
 class SubjectGrade(models.Model):
     MAX_FIRST_TEST = 20
     MAX_SECOND_TEST = 20
     MAX_EXAM = 60
+    MAX_TOTAL = 100
+    SCORE_FIELDS = ('report_id', 'first_test', 'second_test', 'exam', 'manual_total')
 
     student = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -259,9 +488,55 @@ class SubjectGrade(models.Model):
     third_term_score = models.PositiveIntegerField(null=True, blank=True)
     average_score = models.FloatField(null=True, blank=True)
 
+    objects = SubjectGradeQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.student.username if self.student else 'Unknown Student'} - {self.subject or 'Unknown Subject'}"
 
+    # 🧮 Keep GradeReport's totals in step with this row
+    def _report_total(self):
+        # (report id, contribution) as this instance has it, None if unknown
+        if self.get_deferred_fields() & set(self.SCORE_FIELDS):
+            return None
+        return self.report_id, self.total_score
+
+    def _locked_report_total(self):
+        # (report id, contribution) as the database has it, row locked until commit
+        row = SubjectGrade.objects.select_for_update().filter(pk=self.pk).values_list(*self.SCORE_FIELDS).first()
+        if row is None:
+            return None
+        report_id, first_test, second_test, exam, manual_total = row
+        return report_id, manual_total if manual_total is not None else first_test + second_test + exam
+
+    def _apply_total_changes(self, before, after):
+        deltas = {}
+        for state, sign in ((before, -1), (after, 1)):
+            if state and state[0] is not None:
+                score, count = deltas.get(state[0], (0, 0))
+                deltas[state[0]] = (score + sign * state[1], count + sign)
+        for report_id, (score, count) in deltas.items():
+            if score or count:
+                apply_report_total_change(report_id, score, count)
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            # Concurrent edits of this grade queue on the lock, so each one's
+            # delta starts from what the previous one committed
+            before = None if self._state.adding or not self.pk else self._locked_report_total()
+            super().save(*args, **kwargs)
+            after = self._report_total()
+            if after is None or kwargs.get('update_fields') is not None:
+                # Only some fields were written: the rest may differ from this instance
+                after = self._locked_report_total()
+            self._apply_total_changes(before, after)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            before = self._locked_report_total()
+            result = super().delete(*args, **kwargs)
+            self._apply_total_changes(before, None)
+        return result
+
     @property
     def total_score(self):
         if self.manual_total is not None:
@@ -273,16 +548,10 @@ class SubjectGrade(models.Model):
         if self.manual_grade:
             return self.manual_grade.upper()
         total = self.total_score
-        if total >= 70:
-            return 'A'
-        elif total >= 60:
-            return 'B'
-        elif total >= 50:
-            return 'C'
-        elif total >= 45:
-            return 'D'
-        else:
-            return 'F'
+        for minimum, letter in GRADE_BOUNDARIES:
+            if total >= minimum:
+                return letter
+        return FAIL_GRADE
 
     def clean(self):
         # Validate that test scores are within max limits
@@ -305,27 +574,60 @@ class SubjectGrade(models.Model):
 
     class Meta:
         ordering = ['subject']
-class BehaviouralSkill(models.Model):
-    SKILL_CHOICES = [
-        ('Punctuality', 'Punctuality'),
-        ('Neatness', 'Neatness'),
-        ('Attentiveness', 'Attentiveness'),
-        ('Social Development', 'Social Development'),
-        ('Assignment', 'Assignment'),
-        ('Class Participation', 'Class Participation'),
-        ('Perseverance', 'Perseverance'),
-        ('Responsibility', 'Responsibility'),
-        ('Politeness', 'Politeness'),
-        ('Honesty', 'Honesty'),
-        ('Sport & Games', 'Sport & Games'),
-        ('Club Participation', 'Club Participation'),
-        ('Psychomotor', 'Psychomotor'),
+
+
+# 🧾 Report Card Job
+class ReportJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    KIND_CHOICES = [
+        ('latest', 'Latest report'),
+        ('all', 'All reports'),
+        ('class', 'Class report cards'),
     ]
-    RATING_CHOICES = [(i, str(i)) for i in range(1,6)]
-    student = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role':'student'})
-    report = models.ForeignKey(GradeReport, on_delete=models.CASCADE, related_name='behavioural_skills')
-    skill_name = models.CharField(max_length=50, choices=SKILL_CHOICES)
-    rating = models.PositiveSmallIntegerField(choices=RATING_CHOICES)
+
+    # A student's own card, or (for 'class' jobs) every card of a classroom/session/term as a ZIP
+    student = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='report_jobs')
+    classroom = models.ForeignKey('Classroom', on_delete=models.CASCADE, null=True, blank=True)
+    session = models.CharField(max_length=20, blank=True)
+    term = models.CharField(max_length=20, blank=True)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='requested_report_jobs')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='latest')
+    renderer = models.CharField(max_length=20, default='xhtml2pdf')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    # The content-hashed name the card was expected to render to when queued
+    card_name = models.CharField(max_length=255, blank=True)
+    file_name = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
-        unique_together = ('student', 'report', 'skill_name')
\ No newline at end of file
+        ordering = ['created_at']
+        constraints = [
+            # One pending or running job per card, however many requests race to queue it
+            models.UniqueConstraint(
+                fields=['student', 'kind', 'renderer', 'card_name'],
+                condition=Q(status__in=['pending', 'running']),
+                name='unique_active_report_job',
+            ),
+            # Class ZIP names already cover the classroom, period, renderer and content
+            models.UniqueConstraint(
+                fields=['card_name'],
+                condition=Q(status__in=['pending', 'running'], kind='class'),
+                name='unique_active_class_report_job',
+            ),
+        ]
+
+    def __str__(self):
+        owner = self.student.username if self.student else f"{self.classroom} {self.session} {self.term}"
+        return f"{owner} - {self.kind} ({self.status})"
@@ -0,0 +1,66 @@
+# portal/pagination.py
+"""
+Keyset pagination for long newest-first lists.
+
+A page is the rows strictly older than the last row of the previous page,
+``WHERE (ts, id) < (cursor) ORDER BY ts DESC, id DESC LIMIT n``, so page
+500 costs the same single indexed query as page 1. OFFSET paging would
+make the database walk every skipped row instead.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Q
+
+PAGE_SIZE = 25
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+@dataclass
+class KeysetPage:
+    items: list
+    next_cursor: str = ''
+
+    @property
+    def has_next(self):
+        return bool(self.next_cursor)
+
+
+def encode_cursor(moment, pk):
+    # Whole microseconds since the epoch, so the cursor round-trips exactly
+    delta = moment - EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+    return f"{micros}-{pk}"
+
+
+def decode_cursor(cursor):
+    """``(datetime, id)`` from a cursor, or None if it is missing or malformed."""
+    try:
+        micros, pk = (int(part) for part in (cursor or '').split('-'))
+        return EPOCH + timedelta(microseconds=micros), pk
+    except (ValueError, OverflowError):
+        # OverflowError: a moment outside the range datetime can hold
+        return None
+
+
+def keyset_page(queryset, field, cursor=None, per_page=PAGE_SIZE):
+    """
+    One page of ``queryset`` ordered newest first on ``field`` then id.
+
+    ``cursor`` is the ``next_cursor`` of the previous page; pass nothing
+    (or anything unreadable) for the first page.
+    """
+    ordered = queryset.order_by(f'-{field}', '-id')
+    position = decode_cursor(cursor)
+    if position is not None:
+        moment, pk = position
+        ordered = ordered.filter(Q(**{f'{field}__lt': moment}) | Q(**{field: moment, 'id__lt': pk}))
+
+    # One extra row says whether there is another page without a COUNT
+    items = list(ordered[:per_page + 1])
+    if len(items) <= per_page:
+        return KeysetPage(items)
+    items = items[:per_page]
+    last = items[-1]
+    return KeysetPage(items, encode_cursor(getattr(last, field), last.pk))
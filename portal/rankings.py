@@ -0,0 +1,133 @@
+# portal/rankings.py
+"""
+Report totals and class positions computed in the database.
+
+One query sums every report's subjects and ranks the reports within their
+classroom, session and term with ``RANK() OVER``; one ``bulk_update`` writes
+the totals, averages and positions back to GradeReport. Day to day the
+totals are kept current by SubjectGrade itself (see models.py); the bulk
+functions here rebuild them when they drift.
+"""
+
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Avg, Count, F, Sum, Window
+from django.db.models.functions import Coalesce, Rank
+
+from .models import GradeReport, SubjectGrade
+
+RANKED_FIELDS = ['total_available_score', 'overall_score', 'overall_average', 'overall_position']
+
+# Same rule as SubjectGrade.total_score, seen from the report side
+SUBJECT_TOTAL = Coalesce(
+    F('subject_grades__manual_total'),
+    F('subject_grades__first_test') + F('subject_grades__second_test') + F('subject_grades__exam'),
+)
+
+
+def subject_totals(reports):
+    """Annotate reports with ``subject_total``, ``subject_count`` and ``subject_average``."""
+    return reports.annotate(
+        subject_total=Sum(SUBJECT_TOTAL),
+        subject_count=Count('subject_grades'),
+        subject_average=Avg(SUBJECT_TOTAL),
+    )
+
+
+def total_values(report):
+    """The stored aggregates for a report annotated by ``subject_totals``."""
+    return {
+        'total_available_score': report.subject_count * SubjectGrade.MAX_TOTAL,
+        'overall_score': report.subject_total or 0,
+        'overall_average': round(report.subject_average, 2) if report.subject_count else None,
+    }
+
+
+def _update_changed(reports, values_for, fields, batch_size):
+    changed = []
+    for report in reports:
+        values = values_for(report)
+        if any(getattr(report, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(report, field, value)
+            changed.append(report)
+
+    # bulk_update skips post_save; cached report cards are keyed on the
+    # report row, so the new numbers simply produce new cache entries
+    with transaction.atomic():
+        GradeReport.objects.bulk_update(changed, fields, batch_size=batch_size)
+    return len(changed)
+
+
+def reconcile_report_totals(reports=None, batch_size=500):
+    """
+    Recompute the stored totals and averages from scratch.
+
+    SubjectGrade keeps them up to date on save and delete; this repairs
+    anything changed behind its back (queryset ``update()``/``delete()``,
+    raw SQL, fixtures). Returns the number of reports that changed.
+    """
+    if reports is None:
+        reports = GradeReport.objects.all()
+    return _update_changed(
+        subject_totals(reports).order_by('pk'), total_values, RANKED_FIELDS[:3], batch_size
+    )
+
+
+def ordinal(number):
+    if 10 <= number % 100 <= 20:
+        suffix = 'th'
+    else:
+        suffix = {1: 'st', 2: 'nd', 3: 'rd'}.get(number % 10, 'th')
+    return f"{number}{suffix}"
+
+
+def format_position(rank, tied=False):
+    """``3`` -> ``'3rd'``; students sharing a rank get ``'3rd='``."""
+    return ordinal(rank) + ('=' if tied else '')
+
+
+def ranked_reports(reports=None):
+    """
+    Annotate reports with their subject totals and class position.
+
+    Adds ``subject_total``, ``subject_count``, ``subject_average`` and
+    ``position_rank``. Reports without a classroom, session, term or any
+    subjects can't be ranked and are left out.
+    """
+    if reports is None:
+        reports = GradeReport.objects.all()
+    partition = [F('classroom_id'), F('session'), F('term')]
+    ranked = subject_totals(
+        reports.filter(classroom__isnull=False, session__isnull=False, term__isnull=False)
+    )
+    return (
+        ranked
+        .filter(subject_count__gt=0)
+        .annotate(position_rank=Window(Rank(), partition_by=partition, order_by=F('subject_average').desc()))
+        .order_by('classroom_id', 'session', 'term', 'position_rank')
+    )
+
+
+def compute_positions(reports=None, batch_size=500):
+    """
+    Recompute totals, averages and positions for ``reports`` (default: all).
+
+    Pass whole classes (``GradeReport.objects.filter(classroom=..., session=...,
+    term=...)``) - positions are only meaningful against the full class.
+    Returns the number of reports that changed.
+    """
+    ranked = list(ranked_reports(reports))
+    ties = Counter((r.classroom_id, r.session, r.term, r.position_rank) for r in ranked)
+
+    def values_for(report):
+        tied = ties[(report.classroom_id, report.session, report.term, report.position_rank)] > 1
+        return dict(total_values(report), overall_position=format_position(report.position_rank, tied))
+
+    return _update_changed(ranked, values_for, RANKED_FIELDS, batch_size)
+
+
+def rank_class(classroom, session, term):
+    """Recompute positions for one classroom's term."""
+    return compute_positions(GradeReport.objects.filter(classroom=classroom, session=session, term=term))
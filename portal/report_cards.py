@@ -0,0 +1,424 @@
+# portal/report_cards.py
+"""
+Report card rendering shared by the PDF views, the report worker and commands.
+
+Assets and the compiled grades_pdf.html template are loaded once per process
+and reused for every render.
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import mimetypes
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import ExitStack
+from functools import lru_cache
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.files.base import File
+from django.core.files.storage import default_storage
+from django.db.models import F
+from django.template.loader import get_template
+from django.utils.text import slugify
+from pypdf import PdfWriter
+from xhtml2pdf import pisa
+
+from .models import User, GradeReport, SubjectGrade
+from .report_cards_reportlab import render_report_card_reportlab
+
+REPORT_TEMPLATE = 'portal/grades_pdf.html'
+LOGO_STATIC_PATH = 'portal/images/logo.png'
+
+# Report card kinds: the student's latest term, a transcript of every term,
+# or a ZIP of every term card in a classroom for one session and term
+LATEST_REPORT = 'latest'
+ALL_REPORTS = 'all'
+CLASS_REPORTS = 'class'
+
+# Renderers: xhtml2pdf converts grades_pdf.html, reportlab draws the same layout directly
+XHTML2PDF = 'xhtml2pdf'
+REPORTLAB = 'reportlab'
+RENDERERS = [XHTML2PDF, REPORTLAB]
+
+# Rendered PDFs live in default storage: one term card per report under
+# report_cards/<student id>/<renderer>/<report id>/, merged transcripts under
+# .../<renderer>/transcript/, class ZIPs under
+# report_cards/class/<classroom id>/<renderer>/<session-term>/. Each renderer
+# keeps its own directories, so pruning after one render never removes the
+# other renderer's files.
+CACHE_PREFIX = 'report_cards'
+# Bump when the template or renderer changes so old PDFs stop matching
+CACHE_VERSION = 3
+TRANSCRIPT_DIR = 'transcript'
+CLASS_DIR = 'class'
+PROFILE_FIELDS = [
+    'username', 'first_name', 'last_name', 'nationality', 'gender', 'height', 'weight',
+]
+
+logger = logging.getLogger(__name__)
+
+
+class ReportCardError(Exception):
+    """Raised when xhtml2pdf fails to turn a report card into a PDF."""
+
+
+def build_student_profile(student, report):
+    # Calculate time present/absent if needed, or use a default
+    time_present = getattr(report, 'time_present', '120/0')
+    return {
+        "profile_id": student.username,
+        "name": student.get_full_name() or student.username,
+        "nationality": getattr(student, 'nationality', 'NIGERIA'),
+        "classroom": getattr(student.classroom, 'name', 'Not Assigned'),
+        "sex": student.gender or 'Not Specified',
+        "height": str(getattr(student, 'height', 'N/A')),
+        "weight": str(getattr(student, 'weight', 'N/A')),
+        "time_present": time_present,
+    }
+
+
+@lru_cache(maxsize=None)
+def logo_data_uri():
+    """The school logo as a data URI, read and encoded once per process."""
+    logo_path = finders.find(LOGO_STATIC_PATH)
+    if not logo_path:
+        return ''
+    mime_type, _ = mimetypes.guess_type(logo_path)
+    with open(logo_path, "rb") as image_file:
+        encoded_logo = base64.b64encode(image_file.read()).decode('utf-8')
+    return f"data:{mime_type};base64,{encoded_logo}"
+
+
+@lru_cache(maxsize=None)
+def report_template():
+    """The compiled grades_pdf.html template, resolved once per process."""
+    return get_template(REPORT_TEMPLATE)
+
+
+def get_report_student(student_id):
+    """A student with the classroom the profile block needs, in one query."""
+    return User.objects.select_related('classroom').filter(id=student_id, role='student').first()
+
+
+def build_report_context(student, report):
+    """Template context for one student's report card for a single term."""
+    return {
+        'grades': report.subject_grades.all(),
+        'report': report,
+        'student_name': student.get_full_name() or student.username,
+        'student_profile': build_student_profile(student, report),
+        'behavioural_skills': report.behavioural_skills,
+        'logo_url': logo_data_uri(),
+    }
+
+
+def report_card_reports(student, kind):
+    """The GradeReport rows that make up a report card of the given kind."""
+    reports = GradeReport.objects.filter(student=student)
+    if kind == LATEST_REPORT:
+        latest = reports.order_by(F('date_uploaded').desc(nulls_last=True), '-id').first()
+        return [latest] if latest else []
+    # Transcript pages run in session/term order
+    return list(reports.order_by('session', 'term', 'id'))
+
+
+def html_to_pdf(html, dest):
+    pisa_status = pisa.CreatePDF(src=html, dest=dest)
+    if pisa_status.err:
+        raise ReportCardError(f"xhtml2pdf reported {pisa_status.err} error(s)")
+
+
+def resolve_renderer(name=None):
+    """The requested renderer if it is known, otherwise settings.REPORT_CARD_RENDERER."""
+    if name in RENDERERS:
+        return name
+    return getattr(settings, 'REPORT_CARD_RENDERER', XHTML2PDF)
+
+
+def render_context_pdf(context, renderer, dest):
+    """Write the PDF for a grades_pdf.html context into the file object ``dest``."""
+    if renderer == REPORTLAB:
+        render_report_card_reportlab(context, dest)
+    else:
+        html_to_pdf(report_template().render(context), dest)
+
+
+def render_context_pdf_bytes(context, renderer):
+    buffer = BytesIO()
+    render_context_pdf(context, renderer, buffer)
+    return buffer.getvalue()
+
+
+def spooled_pdf_file():
+    """
+    Temporary file for a PDF being rendered.
+
+    Small PDFs stay in memory; anything above REPORT_CARD_SPOOL_MAX_SIZE
+    spills to disk so a large transcript can't exhaust a worker's memory.
+    """
+    max_size = getattr(settings, 'REPORT_CARD_SPOOL_MAX_SIZE', 1024 * 1024)
+    return SpooledTemporaryFile(max_size=max_size)
+
+
+def term_card_digests(student, reports, renderer):
+    """
+    Hash everything that ends up on each report's term card.
+
+    Covers the report itself (behavioural ratings included), its SubjectGrade
+    rows and the student profile fields, so any edit produces a new digest.
+    Returns ``{report id: digest}`` using two queries however many terms
+    there are.
+    """
+    report_ids = [report.pk for report in reports]
+    grades = defaultdict(list)
+    for row in SubjectGrade.objects.filter(report_id__in=report_ids).order_by('id').values():
+        grades[row['report_id']].append(row)
+
+    profile = {
+        'version': CACHE_VERSION,
+        'renderer': renderer,
+        'profile': [getattr(student, field) for field in PROFILE_FIELDS],
+        'classroom': getattr(student.classroom, 'name', None),
+    }
+    digests = {}
+    for row in GradeReport.objects.filter(id__in=report_ids).values():
+        payload = dict(profile, report=row, grades=grades[row['id']])
+        encoded = json.dumps(payload, sort_keys=True, default=str).encode('utf-8')
+        digests[row['id']] = hashlib.sha256(encoded).hexdigest()
+    return digests
+
+
+def term_card_name(student_id, renderer, report_id, digest):
+    return f"{CACHE_PREFIX}/{student_id}/{renderer}/{report_id}/{digest}.pdf"
+
+
+def transcript_name(student_id, renderer, term_digests):
+    # A transcript changes exactly when one of its term cards does
+    digest = hashlib.sha256(':'.join(term_digests).encode('utf-8')).hexdigest()
+    return f"{CACHE_PREFIX}/{student_id}/{renderer}/{TRANSCRIPT_DIR}/{digest}.pdf"
+
+
+def _report_card_name(student, reports, kind, renderer, digests):
+    if kind == LATEST_REPORT:
+        return term_card_name(student.pk, renderer, reports[0].pk, digests[reports[0].pk])
+    return transcript_name(student.pk, renderer, [digests[report.pk] for report in reports])
+
+
+def report_card_name(student, kind, renderer):
+    """Storage name the student's current report card renders to, or None without reports."""
+    reports = report_card_reports(student, kind)
+    if not reports:
+        return None
+    digests = term_card_digests(student, reports, renderer)
+    return _report_card_name(student, reports, kind, renderer, digests)
+
+
+def _save_spooled(name, write):
+    with spooled_pdf_file() as spool:
+        write(spool)
+        spool.seek(0)
+        return default_storage.save(name, File(spool))
+
+
+def _render_term_card(student, report, renderer, name):
+    if default_storage.exists(name):
+        return name
+    context = build_report_context(student, report)
+    saved = _save_spooled(name, lambda spool: render_context_pdf(context, renderer, spool))
+    prune_report_cards(saved)
+    return saved
+
+
+def _merge_pdfs(names, dest):
+    writer = PdfWriter()
+    with ExitStack() as stack:
+        # Keep every source open until the merged file has been written
+        for name in names:
+            writer.append(stack.enter_context(default_storage.open(name, 'rb')))
+        writer.write(dest)
+
+
+def render_report_card(student, kind, renderer):
+    """
+    Render a student's report card into default storage and return its name.
+
+    A transcript (ALL_REPORTS) is one term card per GradeReport merged with
+    pypdf; term cards already in storage are reused, so only the terms that
+    changed are rendered again. Raises ReportCardError if the student has no
+    reports or a render fails.
+    """
+    reports = report_card_reports(student, kind)
+    if not reports:
+        raise ReportCardError("No report available.")
+
+    digests = term_card_digests(student, reports, renderer)
+    name = _report_card_name(student, reports, kind, renderer, digests)
+    if default_storage.exists(name):
+        return name
+    if kind == LATEST_REPORT:
+        return _render_term_card(student, reports[0], renderer, name)
+
+    term_names = [
+        _render_term_card(
+            student, report, renderer, term_card_name(student.pk, renderer, report.pk, digests[report.pk])
+        )
+        for report in reports
+    ]
+    saved = _save_spooled(name, lambda spool: _merge_pdfs(term_names, spool))
+    prune_report_cards(saved)
+    return saved
+
+
+def prune_report_cards(keep):
+    """
+    Delete the PDFs cached alongside ``keep`` that it has superseded.
+
+    ``keep``'s directory only holds one report's PDFs from one renderer.
+    Names are content hashes, so an old PDF is never served once its report
+    changes; it is only left behind. This runs after a fresh render (in the
+    report worker, not a web request), and a storage error just leaves the
+    old files for the next render to clear.
+    """
+    directory, _, filename = keep.rpartition('/')
+    try:
+        _, files = default_storage.listdir(directory)
+        for other in files:
+            if other != filename:
+                default_storage.delete(f"{directory}/{other}")
+    except Exception:
+        logger.warning("Couldn't prune cached report cards in %s", directory, exc_info=True)
+
+
+def class_reports(classroom, session, term):
+    """The GradeReport rows that go into a classroom's report card ZIP."""
+    return GradeReport.objects.filter(classroom=classroom, session=session, term=term, student__isnull=False)
+
+
+def class_report_zip_name(classroom, session, term, renderer):
+    """
+    Storage name of the ZIP of a class's term cards, or None if it has no reports.
+
+    Hashes the same report, grade and profile data as term_card_digests for
+    every student in the class, using three queries.
+    """
+    reports = list(class_reports(classroom, session, term).order_by('id').values())
+    if not reports:
+        return None
+    grades = SubjectGrade.objects.filter(report_id__in=[row['id'] for row in reports]).order_by('id').values()
+    profiles = User.objects.filter(id__in=[row['student_id'] for row in reports]).order_by('id').values_list(
+        'id', 'classroom__name', *PROFILE_FIELDS
+    )
+    payload = {
+        'version': CACHE_VERSION,
+        'renderer': renderer,
+        'reports': reports,
+        'grades': list(grades),
+        'profiles': list(profiles),
+    }
+    digest = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    period = slugify(f"{session} {term}")
+    return f"{CACHE_PREFIX}/{CLASS_DIR}/{classroom.pk}/{renderer}/{period}/{digest}.zip"
+
+
+def render_class_report_zip(classroom, session, term, renderer, max_workers=None):
+    """
+    Render a class's term cards into one ZIP in default storage and return its name.
+
+    Runs in the report worker: the cards are rendered on a process pool by
+    render_class_report_cards, and any that fail are listed in the ZIP's
+    errors.txt. Raises ReportCardError if the class has no reports.
+    """
+    name = class_report_zip_name(classroom, session, term, renderer)
+    if name is None:
+        raise ReportCardError("No reports for this class.")
+    if default_storage.exists(name):
+        return name
+    results = render_class_report_cards(classroom, session, term, max_workers=max_workers, renderer=renderer)
+    saved = _save_spooled(name, lambda spool: spool.writelines(iter_report_zip(results)))
+    prune_report_cards(saved)
+    return saved
+
+
+def _render_pdf(context, renderer):
+    # Runs inside a pool worker, so it must stay a picklable module-level function.
+    return render_context_pdf_bytes(context, renderer)
+
+
+def render_class_report_cards(classroom, session, term, max_workers=None, renderer=None):
+    """
+    Render every report card for a classroom/session/term on a process pool.
+
+    Yields ``(filename, pdf_bytes, error)`` tuples as each render finishes.
+    A failed student yields ``pdf_bytes=None`` and an error message instead
+    of aborting the batch. Contexts are fully loaded here, in the calling
+    process, so pool workers never touch the database.
+    """
+    renderer = resolve_renderer(renderer)
+    reports = (
+        class_reports(classroom, session, term)
+        .select_related('student', 'student__classroom')
+        .prefetch_related('subject_grades')
+        .order_by('student__last_name', 'student__first_name')
+    )
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {}
+        for report in reports:
+            filename = f"{report.student.username}_report.pdf"
+            context = build_report_context(report.student, report)
+            context['grades'] = list(context['grades'])
+            futures[pool.submit(_render_pdf, context, renderer)] = filename
+
+        for future in as_completed(futures):
+            filename = futures[future]
+            try:
+                yield filename, future.result(), None
+            except Exception as exc:
+                yield filename, None, str(exc)
+
+
+class _ZipBuffer:
+    """Write-only sink that hands back whatever zipfile has written so far."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_report_zip(results):
+    """
+    Stream ``(filename, pdf_bytes, error)`` results as a ZIP archive.
+
+    Each PDF is yielded as soon as it is added. Failures are collected into
+    an ``errors.txt`` entry at the end of the archive.
+    """
+    buffer = _ZipBuffer()
+    failures = []
+    # PDFs are already compressed, so store them as-is.
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for filename, pdf, error in results:
+            if error:
+                failures.append(f"{filename}: {error}")
+                continue
+            archive.writestr(filename, pdf)
+            yield buffer.pop()
+        if failures:
+            archive.writestr('errors.txt', '\n'.join(failures) + '\n')
+    yield buffer.pop()
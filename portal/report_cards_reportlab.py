@@ -0,0 +1,231 @@
+# portal/report_cards_reportlab.py
+"""
+Report card renderer that draws grades_pdf.html's layout with ReportLab.
+
+Takes the same context as the template, but skips the HTML/CSS parsing that
+xhtml2pdf does before handing the document to ReportLab.
+"""
+
+import base64
+from functools import lru_cache
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from django.utils.dateformat import format as date_format
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import mm
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+RED = colors.HexColor('#c41e3a')
+BLUE = colors.HexColor('#2088bd')
+GREEN = colors.HexColor('#294f16')
+NAVY = colors.HexColor('#2e3563')
+HEADER_GREY = colors.HexColor('#f0f0f0')
+YELLOW = colors.HexColor('#ffff99')
+PINK = colors.HexColor('#fff5f5')
+
+BASE = ParagraphStyle('base', fontName='Helvetica', fontSize=7.5, leading=8.6)
+SCHOOL_NAME = ParagraphStyle('school_name', BASE, fontName='Helvetica-Bold', fontSize=15, leading=17, textColor=RED)
+SCHOOL_TYPE = ParagraphStyle('school_type', BASE, fontSize=8, leading=10)
+ADDRESS = ParagraphStyle('address', BASE, fontName='Helvetica-Bold', fontSize=7, leading=9, textColor=RED)
+MOTTO = ParagraphStyle('motto', BASE, fontName='Helvetica-Bold', fontSize=7, leading=9, textColor=BLUE, alignment=TA_CENTER)
+TITLE = ParagraphStyle('title', BASE, fontName='Helvetica-Bold', fontSize=7, leading=9, textColor=GREEN, alignment=TA_CENTER)
+PROFILE = ParagraphStyle('profile', BASE, fontSize=9, leading=12.6, textColor=NAVY)
+CELL = ParagraphStyle('cell', BASE, fontSize=8, leading=9.2, alignment=TA_CENTER)
+CELL_LEFT = ParagraphStyle('cell_left', CELL, alignment=0)
+GRADE_KEY = ParagraphStyle('grade_key', BASE, fontSize=6, leading=7.8)
+SUMMARY = ParagraphStyle('summary', BASE, fontSize=10, leading=15)
+BEHAVIOURAL = ParagraphStyle('behavioural', BASE, fontName='Helvetica-Bold', fontSize=9, leading=12.6, textColor=colors.HexColor('#dd0000'))
+
+GRADE_KEY_TEXT = (
+    "<b>GRADE KEY:</b><br/>90%+ (A*) Outstanding<br/>80-89% (A) Excellent<br/>"
+    "70-79% (B) V. Good<br/>60-69% (C) Good<br/>50-59% (D) Fair<br/>"
+    "40-49% (E) Weak<br/>0-39% (F) Fail"
+)
+
+
+def _text(value, default=''):
+    # Mirrors the template's |default filter: falsy values fall back
+    return escape(str(value)) if value else default
+
+
+def _date(value):
+    return date_format(value, 'd/m/Y') if value else ''
+
+
+def _cell(text, style=CELL):
+    return Paragraph(text, style)
+
+
+@lru_cache(maxsize=4)
+def _decode_logo(logo_url):
+    data = base64.b64decode(logo_url.split(',', 1)[1])
+    img_width, img_height = ImageReader(BytesIO(data)).getSize()
+    return data, img_width, img_height
+
+
+def _logo(logo_url, width):
+    if not logo_url or ',' not in logo_url:
+        return ''
+    data, img_width, img_height = _decode_logo(logo_url)
+    return Image(BytesIO(data), width=width, height=width * img_height / img_width)
+
+
+def _header(context, width):
+    report = context['report']
+    profile = context['student_profile']
+    left = [
+        Paragraph("PEN ARK SCHOOLS", SCHOOL_NAME),
+        Paragraph("CRECHE, PREPRIMARY, PRIMARY &amp; COLLEGE", SCHOOL_TYPE),
+        Paragraph("9/11 EDUN STREET LADIPO, OSHODI LAGOS", ADDRESS),
+        Paragraph("TEL: 09063550663; 08063616032", ADDRESS),
+        Paragraph("EMAIL: pen-arkschools119@gmail.com", ADDRESS),
+    ]
+    center = [
+        _logo(context.get('logo_url'), 52),
+        Paragraph("MOTTO: TRAINED FOR DUTY &amp; FOR THEE<br/>(GOVERNMENT APPROVED)", MOTTO),
+        Paragraph(f"{_text(report.term).upper()} ASSESSMENT<br/>SESSION {_text(report.session)}", TITLE),
+    ]
+    right = Paragraph(
+        f"<font size=11 color='black'><b>STUDENT PROFILE:</b></font> {_text(profile['profile_id'])}<br/>"
+        f"<b>NAME:</b> {_text(profile['name'])}<br/>"
+        f"<b>NATIONALITY:</b> {_text(profile['nationality'])}<br/>"
+        f"<b>CLASS:</b> {_text(profile['classroom'])} &nbsp;&nbsp;&nbsp; <b>SEX:</b> {_text(profile['sex'])}<br/>"
+        f"<b>HEIGHT:</b> {_text(profile['height'])} &nbsp;&nbsp;&nbsp; <b>WEIGHT:</b> {_text(profile['weight'])}<br/>"
+        f"<b>TIME PRESENT/ABSENT:</b> {_text(profile['time_present'])}",
+        PROFILE,
+    )
+    table = Table([[left, [c for c in center if c], right]], colWidths=[width * 0.35, width * 0.30, width * 0.35])
+    table.setStyle(TableStyle([
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('LINEBELOW', (0, 0), (-1, 0), 1.5, colors.black),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ]))
+    return table
+
+
+def _grades_table(grades, width):
+    rows = [
+        [_cell("<b>RECORDS OF TESTS AND EXAMINATION</b>")] + [''] * 9 + [Paragraph(GRADE_KEY_TEXT, GRADE_KEY)],
+        [_cell("<b>SUBJECT</b>"), _cell("<b>MARKS</b>"), '', '', '', _cell("<b>TERMLY SUMMARY</b>"), '', '', '', _cell("<b>GRD</b>"), ''],
+        [''] + [_cell(f"<b>{label}</b>") for label in (
+            "1st<br/>20", "2nd<br/>20", "EXM<br/>60", "TOT<br/>100",
+            "1st<br/>100", "2nd<br/>100", "3rd<br/>100", "AVG<br/>%",
+        )] + ['', ''],
+        [_cell("<b>MAX MARKS</b>")] + [_cell(f"<b>{v}</b>") for v in ("20", "20", "60", "100", "100", "100", "100", "100%")]
+        + ['', _cell("<b>COMMENT &amp; TEACHER</b>")],
+    ]
+    header_rows = len(rows)
+
+    for grade in grades:
+        total = grade.total_score
+        rows.append([
+            _cell(_text(grade.subject), CELL_LEFT),
+            _text(grade.first_test, '-'),
+            _text(grade.second_test, '-'),
+            _text(grade.exam, '-'),
+            _text(total, '-'),
+            _text(grade.first_term_score) or _text(total, '-'),
+            _text(grade.second_term_score, '-'),
+            _text(grade.third_term_score, '-'),
+            _text(grade.average_score) or _text(total, '-'),
+            _text(grade.grade, '-'),
+            _cell(f"{_text(grade.grade_comment)} - {_text(getattr(grade, 'teacher', ''))}", CELL_LEFT),
+        ])
+
+    narrow = width * 0.85 / 10
+    col_widths = [narrow * 2.2] + [narrow * 0.875] * 8 + [narrow * 0.8, width * 0.15]
+    table = Table(rows, colWidths=col_widths, repeatRows=header_rows)
+    table.setStyle(TableStyle([
+        ('GRID', (0, 0), (-1, -1), 0.75, colors.black),
+        ('FONT', (0, 0), (-1, -1), 'Helvetica', 8),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('TOPPADDING', (0, 0), (-1, -1), 3),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+        ('LEFTPADDING', (0, 0), (-1, -1), 1),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 1),
+        ('BACKGROUND', (0, 0), (-1, header_rows - 1), HEADER_GREY),
+        ('BACKGROUND', (4, header_rows), (4, -1), YELLOW),
+        ('FONT', (4, header_rows), (4, -1), 'Helvetica-Bold', 8),
+        ('SPAN', (0, 0), (9, 0)),
+        ('SPAN', (10, 0), (10, 2)),
+        ('SPAN', (0, 1), (0, 2)),
+        ('SPAN', (1, 1), (4, 1)),
+        ('SPAN', (5, 1), (8, 1)),
+        ('SPAN', (9, 1), (9, 3)),
+        ('VALIGN', (10, 0), (10, 2), 'TOP'),
+    ]))
+    return table
+
+
+def _summary_table(report, width):
+    left = Paragraph(
+        f"<b>TOTAL AVAILABLE SCORE:</b> {_text(report.total_available_score)}<br/>"
+        f"<b>STUDENT OVERALL SCORE:</b> {_text(report.overall_score)}<br/>"
+        f"<b>STUDENT OVERALL AVERAGE:</b> {_text(report.overall_average)}%<br/>"
+        f"<b>OVERALL POSITION:</b> {_text(report.overall_position)}",
+        SUMMARY,
+    )
+    right = Paragraph(
+        f"<b>TEACHER'S COMMENT:</b> {_text(report.teacher_comment)}<br/>"
+        f"<b>DATE:</b> {_date(report.date_uploaded)} &nbsp;&nbsp; "
+        f"<b>NEXT TERM:</b> {_date(report.next_term_date)}<br/><br/>"
+        f"<b>ADMINISTRATOR'S COMMENT:</b> {_text(report.admin_comment_report)}<br/><br/>"
+        f"<b>SIGN:</b>",
+        SUMMARY,
+    )
+    table = Table([[left, right]], colWidths=[width / 2, width / 2])
+    table.setStyle(TableStyle([
+        ('BOX', (0, 0), (-1, -1), 1.5, colors.black),
+        ('INNERGRID', (0, 0), (-1, -1), 1.5, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('TOPPADDING', (0, 0), (-1, -1), 4.5),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 4.5),
+    ]))
+    return table
+
+
+def _behavioural_strip(skills, width):
+    ratings = " &nbsp; ".join(
+        f"{_text(skill.skill_name).upper()}({_text(skill.rating)})" for skill in skills
+    )
+    text = (
+        "BEHAVIOURAL SKILL KEY: EXCELLENT(5) HIGH(4) ACCEPTABLE(3) MINIMUM(2) NO REGARD(1)<br/>"
+        + ratings
+    )
+    table = Table([[Paragraph(text, BEHAVIOURAL)]], colWidths=[width])
+    table.setStyle(TableStyle([
+        ('BOX', (0, 0), (-1, -1), 1.5, RED),
+        ('BACKGROUND', (0, 0), (-1, -1), PINK),
+        ('TOPPADDING', (0, 0), (-1, -1), 4),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+    ]))
+    return table
+
+
+def render_report_card_reportlab(context, dest):
+    """Build the report card PDF for a grades_pdf.html context and write it to ``dest``."""
+    doc = SimpleDocTemplate(
+        dest,
+        pagesize=A4,
+        leftMargin=8 * mm,
+        rightMargin=8 * mm,
+        topMargin=6 * mm,
+        bottomMargin=6 * mm,
+        title=f"{context['student_name']} - Report Card",
+    )
+    width = doc.width
+    doc.build([
+        _header(context, width),
+        Spacer(1, 7),
+        _grades_table(context['grades'], width),
+        Spacer(1, 6),
+        _summary_table(context['report'], width),
+        Spacer(1, 4.5),
+        _behavioural_strip(context['behavioural_skills'], width),
+    ])
@@ -0,0 +1,107 @@
+# portal/report_jobs.py
+"""DB-backed queue that moves report card rendering out of web requests."""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import ReportJob
+from .report_cards import (
+    CLASS_REPORTS, class_report_zip_name, get_report_student, render_class_report_zip, render_report_card,
+    report_card_name,
+)
+
+
+def _enqueue(card, requested_by):
+    # Reuse the active job for this card, else create one; the active-job
+    # unique constraints settle requests that race to queue the same card
+    job = ReportJob.objects.filter(status__in=[ReportJob.PENDING, ReportJob.RUNNING], **card).first()
+    if job:
+        return job
+    try:
+        with transaction.atomic():
+            return ReportJob.objects.create(requested_by=requested_by, **card)
+    except IntegrityError:
+        # Another request queued it first; it may even have finished since
+        return ReportJob.objects.filter(**card).latest('created_at', 'id')
+
+
+def enqueue_report_job(student, kind, renderer, requested_by=None, card_name=None):
+    """
+    Queue a render, reusing a job that is already waiting for the same card.
+
+    Jobs are matched on the card's content-hashed name as well (pass
+    ``card_name`` if it is already known), so a job started before the
+    report changed is never handed out for the new content.
+    """
+    if card_name is None:
+        card_name = report_card_name(student, kind, renderer)
+    return _enqueue(
+        dict(student=student, kind=kind, renderer=renderer, card_name=card_name or ''), requested_by
+    )
+
+
+def enqueue_class_report_job(classroom, session, term, renderer, requested_by=None, card_name=None):
+    """Queue a ZIP of a class's term cards, matched on its content-hashed name like a single card."""
+    if card_name is None:
+        card_name = class_report_zip_name(classroom, session, term, renderer)
+    return _enqueue(dict(
+        kind=CLASS_REPORTS, classroom=classroom, session=session, term=term, renderer=renderer,
+        card_name=card_name or '',
+    ), requested_by)
+
+
+def enqueue_again(job, requested_by=None):
+    """Queue a fresh job for the same card as ``job``, e.g. once its file is gone."""
+    if job.kind == CLASS_REPORTS:
+        return enqueue_class_report_job(job.classroom, job.session, job.term, job.renderer, requested_by)
+    return enqueue_report_job(job.student, job.kind, job.renderer, requested_by)
+
+
+def claim_next_job():
+    """Mark the oldest pending job as running and return it, or None."""
+    with transaction.atomic():
+        job = (
+            ReportJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=ReportJob.PENDING)
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = ReportJob.RUNNING
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'started_at'])
+    return job
+
+
+def run_job(job):
+    try:
+        if job.kind == CLASS_REPORTS:
+            job.file_name = render_class_report_zip(job.classroom, job.session, job.term, job.renderer)
+        else:
+            job.file_name = render_report_card(get_report_student(job.student_id), job.kind, job.renderer)
+        job.status = ReportJob.DONE
+        job.error = ''
+    except Exception as exc:
+        job.status = ReportJob.FAILED
+        job.error = str(exc)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['file_name', 'status', 'error', 'finished_at'])
+    return job
+
+
+def requeue_interrupted_jobs():
+    """
+    Put back jobs left running by a worker that died mid-render.
+
+    Only jobs running for longer than REPORT_JOB_TIMEOUT count; a newer one
+    may belong to another worker that is still rendering it.
+    """
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'REPORT_JOB_TIMEOUT', 10 * 60))
+    return ReportJob.objects.filter(status=ReportJob.RUNNING, started_at__lt=cutoff).update(
+        status=ReportJob.PENDING, started_at=None
+    )
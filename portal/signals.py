@@ -0,0 +1,51 @@
+# portal/signals.py
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import User, GradeReport, SubjectGrade, Timetable
+from .class_stats import invalidate_class_stats
+from .timetables import invalidate_timetable_grids
+
+
+def _invalidate_stats_later(report):
+    if report is not None and report.classroom_id is not None:
+        key = (report.classroom_id, report.session, report.term)
+        # robust: the edit is already committed, a cache hiccup mustn't 500 it
+        transaction.on_commit(lambda: invalidate_class_stats(*key), robust=True)
+
+
+# 📊 Class statistics cache invalidation. Report card PDFs need none: their
+# names hash the report's contents, and the report worker prunes old ones.
+@receiver([post_save, post_delete], sender=GradeReport)
+def grade_report_changed(sender, instance, **kwargs):
+    _invalidate_stats_later(instance)
+
+
+@receiver([post_save, post_delete], sender=SubjectGrade)
+def subject_grade_changed(sender, instance, **kwargs):
+    report = GradeReport.objects.filter(pk=instance.report_id).only('classroom', 'session', 'term').first()
+    _invalidate_stats_later(report)
+
+
+def _invalidate_grids_later(classroom_ids):
+    classroom_ids = set(classroom_ids) - {None}
+    if classroom_ids:
+        transaction.on_commit(lambda: invalidate_timetable_grids(classroom_ids), robust=True)
+
+
+# 🗓️ Timetable grid cache invalidation
+@receiver([post_save, post_delete], sender=Timetable)
+def timetable_changed(sender, instance, **kwargs):
+    _invalidate_grids_later({instance.classroom_id, getattr(instance, '_stored_classroom_id', None)})
+
+
+@receiver(post_save, sender=User)
+def teacher_name_changed(sender, instance, created=False, update_fields=None, **kwargs):
+    # Grids show teacher names; a new teacher has no periods yet
+    if instance.role != 'teacher' or created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    _invalidate_grids_later(
+        Timetable.objects.filter(teacher=instance).values_list('classroom_id', flat=True).distinct()
+    )
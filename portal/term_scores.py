@@ -0,0 +1,72 @@
+# portal/term_scores.py
+"""
+Cumulative term scores carried forward across a session.
+
+A subject's 1st/2nd/3rd term columns and its running average are copied from
+the same student's reports for the earlier terms, so teachers only enter
+the current term's tests and exam.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import GradeReport, SubjectGrade
+
+TERMS = [term for term, _ in GradeReport.TERM_CHOICES]
+TERM_FIELDS = ['first_term_score', 'second_term_score', 'third_term_score']
+
+
+def _subject_key(subject):
+    return ' '.join((subject or '').split()).lower()
+
+
+def carry_forward_scores(session, classroom=None, batch_size=500):
+    """
+    Fill the term score columns for every subject grade in ``session``.
+
+    One query reads the session's grades with their totals, one
+    ``bulk_update`` writes back the rows whose columns changed. A grade only
+    sees terms up to its own: a 2nd term row gets the 1st and 2nd term totals
+    and their average. A term with no report leaves its column as it is.
+    Returns the number of rows updated.
+    """
+    grades = (
+        SubjectGrade.objects.with_totals()
+        .filter(report__session=session, report__term__in=TERMS)
+        .select_related('report')
+        .only(*TERM_FIELDS, 'average_score', 'subject', 'report__student_id', 'report__term')
+    )
+    if classroom is not None:
+        grades = grades.filter(report__classroom=classroom)
+    grades = list(grades)
+
+    # (student, subject) -> {term index: total}
+    totals = defaultdict(dict)
+    for grade in grades:
+        key = (grade.report.student_id, _subject_key(grade.subject))
+        totals[key][TERMS.index(grade.report.term)] = grade.total
+
+    changed = []
+    for grade in grades:
+        by_term = totals[(grade.report.student_id, _subject_key(grade.subject))]
+        current = TERMS.index(grade.report.term)
+        # Without a report for a term (a transfer student, or one in another
+        # classroom) keep whatever score was entered by hand
+        values = {
+            field: by_term[index] if index in by_term else getattr(grade, field)
+            for index, field in enumerate(TERM_FIELDS[:current + 1])
+        }
+        scores = [score for score in values.values() if score is not None]
+        values['average_score'] = round(sum(scores) / len(scores), 2) if scores else None
+
+        if any(getattr(grade, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(grade, field, value)
+            changed.append(grade)
+
+    # bulk_update skips SubjectGrade.save(); these columns don't feed the
+    # report totals, and cached report cards are keyed on the row contents
+    with transaction.atomic():
+        SubjectGrade.objects.bulk_update(changed, TERM_FIELDS + ['average_score'], batch_size=batch_size)
+    return len(changed)
@@ -0,0 +1,48 @@
+# portal/timetable_conflicts.py
+"""
+Whole-school timetable clash detection.
+
+Periods are grouped by (teacher, day) and (classroom, day), and each group
+is swept once in start-time order. A heap keyed on end time holds the
+periods still running, so finding every overlap costs O(n log n + k) for
+n periods and k clashes, not a comparison of every pair.
+
+Single inserts are checked against the database instead; see
+Timetable.clean().
+"""
+
+import heapq
+from collections import defaultdict, namedtuple
+
+# ``kind`` is 'classroom' or 'teacher'; ``first`` starts no later than ``second``
+Clash = namedtuple('Clash', ['kind', 'day', 'first', 'second'])
+
+
+def overlapping_pairs(periods):
+    """
+    Yield ``(earlier, later)`` for every pair of periods in ``periods``
+    whose times overlap. Back-to-back periods don't count.
+    """
+    running = []  # (end_time, tiebreak, period)
+    for index, period in enumerate(sorted(periods, key=lambda p: (p.start_time, p.end_time, p.pk or 0))):
+        while running and running[0][0] <= period.start_time:
+            heapq.heappop(running)
+        for _, _, earlier in running:
+            yield earlier, period
+        heapq.heappush(running, (period.end_time, index, period))
+
+
+def find_clashes(periods):
+    """Every clash among ``periods``, classroom clashes and teacher clashes alike."""
+    groups = defaultdict(list)
+    for period in periods:
+        groups['classroom', period.classroom_id, period.day].append(period)
+        if period.teacher_id is not None:
+            groups['teacher', period.teacher_id, period.day].append(period)
+
+    clashes = []
+    for (kind, _, day), group in groups.items():
+        if len(group) > 1:
+            clashes.extend(Clash(kind, day, first, second) for first, second in overlapping_pairs(group))
+    return clashes
+
@@ -0,0 +1,291 @@
+# portal/timetable_generator.py
+"""
+Clash-free weekly timetables for many classrooms at once.
+
+The input is a list of requirements. Each requirement says that a
+classroom needs ``periods`` lessons of ``subject`` a week from one
+teacher. The input also gives the school day's slots. The search
+backtracks with forward checking:
+
+- Each step places one lesson for the requirement with the least room
+  left, meaning its free slots minus the lessons it still needs.
+- The lesson goes in the slot that its classroom's and teacher's other
+  requirements are least likely to need.
+- When any requirement, classroom or teacher can no longer fit, the
+  search backs off straight away.
+
+Free slots are integer bitmasks, so each check is a few ANDs and a
+popcount. Lessons of a subject are spread over the week, at most
+ceil(periods / days) a day.
+
+An attempt that backtracks too often gives up. The next attempt uses a
+different seed for its tie-breaks. With ``workers`` > 1 the attempts run
+in parallel and the first timetable found wins.
+"""
+
+import math
+import random
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.db import transaction
+
+from .models import Timetable
+from .timetables import invalidate_timetable_grids
+
+Slot = namedtuple('Slot', ['day', 'start_time', 'end_time'])
+Requirement = namedtuple('Requirement', ['classroom_id', 'subject', 'teacher_id', 'periods'])
+
+ATTEMPTS = 50
+MAX_BACKTRACKS = 2000
+# How much randomness each attempt adds to slot choice
+SLOT_NOISE = 0.3
+
+
+class TimetableGenerationError(Exception):
+    """The requirements can't fit the slots, or no attempt found a timetable."""
+
+
+def _bits(mask):
+    slots = []
+    while mask:
+        low = mask & -mask
+        slots.append(low.bit_length() - 1)
+        mask ^= low
+    return slots
+
+
+class _Search:
+    def __init__(self, requirements, slot_days, teacher_busy, seed):
+        days = list(dict.fromkeys(slot_days))
+        self.day_of = [days.index(day) for day in slot_days]
+        self.day_masks = [sum(1 << s for s, d in enumerate(self.day_of) if d == index) for index in range(len(days))]
+        self.full = (1 << len(slot_days)) - 1
+
+        self.classroom_of = [r.classroom_id for r in requirements]
+        self.teacher_of = [r.teacher_id for r in requirements]
+        self.remaining = [r.periods for r in requirements]
+        self.cap = [math.ceil(r.periods / len(days)) for r in requirements]
+        self.day_count = [[0] * len(days) for _ in requirements]
+        self.blocked = [0] * len(requirements)
+        self.placed = [[] for _ in requirements]
+
+        self.classroom_busy = dict.fromkeys(self.classroom_of, 0)
+        self.teacher_busy = dict.fromkeys(self.teacher_of, 0)
+        for teacher_id, mask in teacher_busy.items():
+            if teacher_id in self.teacher_busy:
+                self.teacher_busy[teacher_id] = mask
+        self.classroom_left = dict.fromkeys(self.classroom_busy, 0)
+        self.teacher_left = dict.fromkeys(self.teacher_busy, 0)
+        for r, periods in enumerate(self.remaining):
+            self.classroom_left[self.classroom_of[r]] += periods
+            if self.teacher_of[r] is not None:
+                self.teacher_left[self.teacher_of[r]] += periods
+
+        # Requirements that compete with each one for slots
+        by_classroom, by_teacher = {}, {}
+        for r, (classroom_id, teacher_id) in enumerate(zip(self.classroom_of, self.teacher_of)):
+            by_classroom.setdefault(classroom_id, []).append(r)
+            if teacher_id is not None:
+                by_teacher.setdefault(teacher_id, []).append(r)
+        self.rivals = [
+            sorted((set(by_classroom[classroom_id]) | set(by_teacher.get(teacher_id, ()))) - {r})
+            for r, (classroom_id, teacher_id) in enumerate(zip(self.classroom_of, self.teacher_of))
+        ]
+
+        self.rng = random.Random(seed)
+        self.tiebreak = [self.rng.random() for _ in requirements]
+        self.backtracks = 0
+
+    def free_slots(self, r):
+        busy = self.classroom_busy[self.classroom_of[r]] | self.teacher_busy[self.teacher_of[r]] | self.blocked[r]
+        return self.full & ~busy
+
+    def pick(self):
+        """``(requirement, free slots)`` to place next, or None at a dead end."""
+        for owners_busy, owners_left in ((self.classroom_busy, self.classroom_left), (self.teacher_busy, self.teacher_left)):
+            for owner, left in owners_left.items():
+                if left and (self.full & ~owners_busy[owner]).bit_count() < left:
+                    return None
+
+        best, best_key, best_free = None, None, 0
+        for r, remaining in enumerate(self.remaining):
+            if not remaining:
+                continue
+            free = self.free_slots(r)
+            room = free.bit_count() - remaining
+            if room < 0:
+                return None
+            key = (room, self.tiebreak[r])
+            if best_key is None or key < best_key:
+                best, best_key, best_free = r, key, free
+        return best, best_free
+
+    def order_slots(self, r, free):
+        """``free`` slots of ``r``, least needed by its rivals first."""
+        slots = _bits(free)
+        # A rival with n free slots and k lessons to go needs each one with odds k/n
+        demand = {slot: self.rng.random() * SLOT_NOISE for slot in slots}
+        for rival in self.rivals[r]:
+            if not self.remaining[rival]:
+                continue
+            rival_free = self.free_slots(rival)
+            if rival_free & free:
+                odds = self.remaining[rival] / rival_free.bit_count()
+                for slot in _bits(rival_free & free):
+                    demand[slot] += odds
+        return sorted(slots, key=demand.__getitem__)
+
+    def place(self, r, slot):
+        bit = 1 << slot
+        classroom_id, teacher_id = self.classroom_of[r], self.teacher_of[r]
+        self.classroom_busy[classroom_id] |= bit
+        self.classroom_left[classroom_id] -= 1
+        if teacher_id is not None:
+            self.teacher_busy[teacher_id] |= bit
+            self.teacher_left[teacher_id] -= 1
+        self.placed[r].append(slot)
+        self.remaining[r] -= 1
+        day = self.day_of[slot]
+        self.day_count[r][day] += 1
+        if self.day_count[r][day] == self.cap[r]:
+            self.blocked[r] |= self.day_masks[day]
+
+    def unplace(self, r):
+        slot = self.placed[r].pop()
+        bit = 1 << slot
+        classroom_id, teacher_id = self.classroom_of[r], self.teacher_of[r]
+        self.classroom_busy[classroom_id] &= ~bit
+        self.classroom_left[classroom_id] += 1
+        if teacher_id is not None:
+            self.teacher_busy[teacher_id] &= ~bit
+            self.teacher_left[teacher_id] += 1
+        self.remaining[r] += 1
+        day = self.day_of[slot]
+        if self.day_count[r][day] == self.cap[r]:
+            self.blocked[r] &= ~self.day_masks[day]
+        self.day_count[r][day] -= 1
+
+    def run(self, max_backtracks):
+        """Slots per requirement, or None if the search gave up."""
+        to_place = sum(self.remaining)
+        frames = []  # [requirement, ordered candidate slots, next candidate]
+        while to_place:
+            picked = self.pick()
+            frames.append([picked[0], self.order_slots(*picked), 0] if picked else [None, [], 0])
+            while True:
+                frame = frames[-1]
+                if frame[2] < len(frame[1]):
+                    self.place(frame[0], frame[1][frame[2]])
+                    frame[2] += 1
+                    to_place -= 1
+                    break
+                frames.pop()
+                self.backtracks += 1
+                if not frames or self.backtracks > max_backtracks:
+                    return None
+                self.unplace(frames[-1][0])
+                to_place += 1
+        return self.placed
+
+
+def _attempt(requirements, slot_days, teacher_busy, seed, max_backtracks):
+    return _Search(requirements, slot_days, teacher_busy, seed).run(max_backtracks)
+
+
+def check_capacity(requirements, slot_count, teacher_busy=None):
+    """Raise TimetableGenerationError if a classroom or teacher needs more periods than the week has."""
+    teacher_busy = teacher_busy or {}
+    classroom_load, teacher_load = {}, {}
+    for requirement in requirements:
+        if requirement.periods < 0:
+            raise TimetableGenerationError(f"{requirement.subject} can't have a negative number of periods.")
+        classroom_load[requirement.classroom_id] = classroom_load.get(requirement.classroom_id, 0) + requirement.periods
+        if requirement.teacher_id is not None:
+            teacher_load[requirement.teacher_id] = teacher_load.get(requirement.teacher_id, 0) + requirement.periods
+    for classroom_id, load in classroom_load.items():
+        if load > slot_count:
+            raise TimetableGenerationError(f"Classroom {classroom_id} needs {load} periods but the week has {slot_count} slots.")
+    for teacher_id, load in teacher_load.items():
+        free = slot_count - teacher_busy.get(teacher_id, 0).bit_count()
+        if load > free:
+            raise TimetableGenerationError(f"Teacher {teacher_id} needs {load} periods but is free for only {free}.")
+
+
+def solve(requirements, slot_days, teacher_busy=None, seed=0, attempts=ATTEMPTS,
+          max_backtracks=MAX_BACKTRACKS, workers=1):
+    """
+    Slot indexes for each requirement's lessons, in requirement order.
+
+    ``slot_days`` gives the day of each slot. ``teacher_busy`` maps teacher
+    ids to bitmasks of slots they already teach elsewhere. Raises
+    TimetableGenerationError if the load can't fit or every attempt gives up.
+    """
+    requirements = [Requirement(*r) for r in requirements]
+    teacher_busy = teacher_busy or {}
+    check_capacity(requirements, len(slot_days), teacher_busy)
+    args = (requirements, list(slot_days), teacher_busy)
+    seeds = range(seed, seed + attempts)
+
+    if workers == 1:
+        for attempt_seed in seeds:
+            placed = _attempt(*args, attempt_seed, max_backtracks)
+            if placed is not None:
+                return placed
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        try:
+            futures = [pool.submit(_attempt, *args, attempt_seed, max_backtracks) for attempt_seed in seeds]
+            for future in as_completed(futures):
+                placed = future.result()
+                if placed is not None:
+                    return placed
+        finally:
+            # Don't wait for attempts still running once one has succeeded
+            pool.shutdown(wait=False, cancel_futures=True)
+    raise TimetableGenerationError(f"No clash-free timetable found in {attempts} attempt(s).")
+
+
+def busy_masks(slots, periods):
+    """``{teacher id: bitmask}`` of the slots each teacher's ``periods`` overlap."""
+    masks = {}
+    for period in periods:
+        for index, slot in enumerate(slots):
+            if slot.day == period.day and slot.start_time < period.end_time and period.start_time < slot.end_time:
+                masks[period.teacher_id] = masks.get(period.teacher_id, 0) | (1 << index)
+    return masks
+
+
+def generate_timetable(requirements, slots, **options):
+    """
+    Unsaved Timetable rows meeting every requirement without a clash.
+
+    Teachers' periods in classrooms outside ``requirements`` stay booked,
+    so the new timetable fits around them. ``options`` go to solve().
+    """
+    requirements = [Requirement(*r) for r in requirements]
+    slots = [Slot(*s) for s in slots]
+    classroom_ids = {r.classroom_id for r in requirements}
+    teacher_ids = {r.teacher_id for r in requirements} - {None}
+    elsewhere = Timetable.objects.filter(teacher_id__in=teacher_ids).exclude(classroom_id__in=classroom_ids)
+
+    placed = solve(requirements, [s.day for s in slots], busy_masks(slots, elsewhere), **options)
+    return [
+        Timetable(
+            classroom_id=requirement.classroom_id, teacher_id=requirement.teacher_id, subject=requirement.subject,
+            day=slots[index].day, start_time=slots[index].start_time, end_time=slots[index].end_time,
+        )
+        for requirement, indexes in zip(requirements, placed)
+        for index in indexes
+    ]
+
+
+def replace_timetables(periods, classroom_ids):
+    """Swap every period of ``classroom_ids`` for ``periods`` in one transaction."""
+    classroom_ids = set(classroom_ids)
+    with transaction.atomic():
+        Timetable.objects.filter(classroom_id__in=classroom_ids).delete()
+        created = Timetable.objects.bulk_create(periods, batch_size=500)
+        # bulk_create skips the signals that keep the grid cache fresh
+        transaction.on_commit(lambda: invalidate_timetable_grids(classroom_ids), robust=True)
+    return created
@@ -0,0 +1,93 @@
+# portal/timetables.py
+"""
+Day × time-slot timetable grids, built and cached per classroom.
+
+Any number of classrooms' grids are built from one query, with each
+period's slot label formatted once and placed through a dict index. Grids
+stay cached until a period in that classroom (or its teacher's name)
+changes; see signals.py.
+"""
+
+from collections import defaultdict
+
+from django.core.cache import cache
+
+from .models import Timetable
+
+CACHE_TIMEOUT = 60 * 60 * 24
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+
+
+def grid_cache_key(classroom_id):
+    return f"timetable_grid:{classroom_id}"
+
+
+def invalidate_timetable_grids(classroom_ids):
+    cache.delete_many([grid_cache_key(classroom_id) for classroom_id in classroom_ids])
+
+
+def slot_label(period):
+    return f"{period.start_time:%H:%M} - {period.end_time:%H:%M}"
+
+
+def empty_grid():
+    return {'time_slots': [], 'timetable': {day: [] for day in DAYS}}
+
+
+def build_grids(periods):
+    """
+    ``{classroom id: grid}`` for every classroom that has periods.
+
+    A grid is ``{'time_slots': [label, ...], 'timetable': {day: [cell, ...]}}``
+    where each cell is ``{'subject', 'teacher'}`` or None for a free slot.
+    Periods on days outside DAYS are left off.
+    """
+    by_classroom = defaultdict(list)
+    for period in periods:
+        by_classroom[period.classroom_id].append((slot_label(period), period))
+
+    grids = {}
+    for classroom_id, labelled in by_classroom.items():
+        time_slots = sorted({label for label, _ in labelled})
+        column = {label: index for index, label in enumerate(time_slots)}
+        timetable = {day: [None] * len(time_slots) for day in DAYS}
+        for label, period in labelled:
+            row = timetable.get(period.day)
+            if row is not None:
+                row[column[label]] = {
+                    'subject': period.subject,
+                    'teacher': period.teacher.get_full_name() if period.teacher else '',
+                }
+        grids[classroom_id] = {'time_slots': time_slots, 'timetable': timetable}
+    return grids
+
+
+def get_timetable_grids(classroom_ids):
+    """
+    ``{classroom id: grid}`` for each id, from the cache where possible.
+
+    Classrooms missing from the cache are built together in one query;
+    classrooms without periods get an empty grid (cached as well).
+    """
+    classroom_ids = list(classroom_ids)
+    cached = cache.get_many([grid_cache_key(classroom_id) for classroom_id in classroom_ids])
+    grids = {
+        classroom_id: cached[grid_cache_key(classroom_id)]
+        for classroom_id in classroom_ids if grid_cache_key(classroom_id) in cached
+    }
+
+    missing = [classroom_id for classroom_id in classroom_ids if classroom_id not in grids]
+    if missing:
+        built = build_grids(
+            Timetable.objects.filter(classroom_id__in=missing)
+            .select_related('teacher')
+            .order_by('day', 'start_time', 'id')
+        )
+        fresh = {classroom_id: built.get(classroom_id) or empty_grid() for classroom_id in missing}
+        cache.set_many({grid_cache_key(classroom_id): grid for classroom_id, grid in fresh.items()}, CACHE_TIMEOUT)
+        grids.update(fresh)
+    return grids
+
+
+def get_timetable_grid(classroom_id):
+    return get_timetable_grids([classroom_id])[classroom_id]
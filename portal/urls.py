@@ -24,6 +24,8 @@ urlpatterns = [
     path('student/test-examination-grades/', views.student_grades_view, name='student_test_examination_grades'),
     path('download-my-grade-report/', views.download_my_grade_report_pdf, name='download_my_grade_report_pdf'),
     path("student/first-tests/", views.student_first_tests, name="student_first_tests"),
+    path('report-cards/jobs/<int:job_id>/', views.report_job_status, name='report_job_status'),
+    path('report-cards/jobs/<int:job_id>/download/', views.report_job_download, name='report_job_download'),
 
     # 🧑‍🏫 Teacher Dashboard & Features
     path('teacher/dashboard/', views.teacher_dashboard, name='teacher_dashboard'),
@@ -38,8 +40,12 @@ urlpatterns = [
     path('teacher/grades/', views.teacher_grades, name='teacher_grades'),
     path('teacher/grades/delete/<int:grade_id>/', views.delete_final_grade, name='delete_final_grade'),
     path('teacher/upload-grades/', views.teacher_upload_grades, name='teacher_upload_grades'),
+    path('teacher/import-grades/', views.teacher_import_grades, name='teacher_import_grades'),
+    path('teacher/grade-grid/', views.teacher_grade_grid, name='teacher_grade_grid'),
+    path('teacher/behavioural-skills/', views.teacher_behavioural_matrix, name='teacher_behavioural_matrix'),
     path('teacher/edit-grade/<int:grade_id>/', views.edit_grade, name='edit_grade'),
     path("teacher/first-test/", views.first_test_upload, name="first_test_upload"),
+    path("teacher/first-test/batch/", views.first_test_batch_upload, name="first_test_batch_upload"),
     path("teacher/first-test/edit/<int:grade_id>/", views.first_test_edit, name="first_test_edit"),
     path("teacher/first-test/delete/<int:grade_id>/", views.first_test_delete, name="first_test_delete"),
 
@@ -57,11 +63,16 @@ urlpatterns = [
     path('dashboard-admin/grades/delete/<int:grade_id>/', views.delete_student_grade, name='delete_student_grade'),
     path('dashboard-admin/grades/<int:grade_id>/edit/', views.edit_grade, name='edit_grade'),
     path('dashboard-admin/grades/download/<int:student_id>/', views.admin_download_grade_report_pdf, name='admin_download_grade_report_pdf'),
+    path('dashboard-admin/grades/download-class/', views.admin_download_class_report_cards, name='admin_download_class_report_cards'),
+    path('dashboard-admin/grades/carry-forward/', views.admin_carry_forward_scores, name='admin_carry_forward_scores'),
+    path('dashboard-admin/grades/statistics/', views.admin_class_statistics, name='admin_class_statistics'),
+    path('dashboard-admin/grades/export/', views.admin_export_grades_csv, name='admin_export_grades_csv'),
     path('dashboard-admin/announcements/', views.manage_announcements, name='manage_announcements'),
     path('dashboard-admin/announcements/create/', views.create_announcement, name='create_announcement'),
     path('dashboard-admin/announcements/edit/<int:announcement_id>/', views.edit_announcement, name='edit_announcement'),
     path('dashboard-admin/announcements/delete/<int:announcement_id>/', views.delete_announcement, name='delete_announcement'),
     path("dashboard-admin/first-test/", views.first_test_upload, name="admin_first_test_upload"),
+    path("dashboard-admin/first-test/batch/", views.first_test_batch_upload, name="admin_first_test_batch_upload"),
     path("dashboard-admin/first-test/edit/<int:grade_id>/", views.first_test_edit, name="admin_first_test_edit"),
     path("dashboard-admin/first-test/delete/<int:grade_id>/", views.first_test_delete, name="admin_first_test_delete"),
 
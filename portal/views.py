@@ -1,8 +1,11 @@
 # Django core imports
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse, HttpResponseForbidden
-from django.template.loader import get_template
-from django.conf import settings
+from django.http import (
+    FileResponse, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+)
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.urls import reverse
 from django.utils import timezone
 from django.utils.timezone import now
 from django.utils.dateparse import parse_date
@@ -11,26 +14,41 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.templatetags.static import static
 from django.db.models import Q
-import mimetypes
-from django.db.models import Max, Q
-from io import BytesIO
+from django.db.models import Count, Max, Q
+from django.db import transaction
 from django.template.loader import render_to_string
+from django.utils.text import slugify
 
-import os
-import base64
+import csv
+import re
 from collections import defaultdict
 from datetime import datetime, time, timedelta
-
-# Third-party imports
-from xhtml2pdf import pisa
+from urllib.parse import urlencode
 
 # Local app imports
 from .models import (
     User, Assignment, Grade, SubjectGrade, GradeReport, Resource,
-    Announcement, Timetable, Submission, Teacher, Classroom, RegistrationCode, BehaviouralSkill
+    Announcement, Timetable, Submission, Teacher, Classroom, RegistrationCode,
+    ReportJob
 )
 from .forms import ResourceForm, AnnouncementForm
 from .decorators import student_required, teacher_required
+from .report_cards import (
+    LATEST_REPORT, ALL_REPORTS, CLASS_REPORTS, report_card_name, class_report_zip_name,
+    resolve_renderer, get_report_student,
+)
+from .report_jobs import enqueue_again, enqueue_class_report_job, enqueue_report_job
+from .rankings import rank_class
+from .class_stats import get_class_stats
+from .grade_import import (
+    REQUIRED_COLUMNS, OPTIONAL_COLUMNS, GradeImportError, import_grades, read_rows
+)
+from .term_scores import carry_forward_scores
+from .pagination import keyset_page
+from .timetables import DAYS, empty_grid, get_timetable_grid, get_timetable_grids
+from .behavioural_skills import (
+    SKILL_NAMES, parse_rating, parse_ratings, save_ratings
+)
 
 
 def welcome(request):
@@ -230,30 +248,12 @@ def student_timetable(request):
     classroom = student.classroom
     current_day = datetime.now().strftime("%A")
 
-    periods = Timetable.objects.filter(classroom=classroom).order_by('day', 'start_time')
-
-    # Time slots (e.g., "09:00 - 10:00")
-    time_slots = sorted(set([
-        f"{p.start_time.strftime('%H:%M')} - {p.end_time.strftime('%H:%M')}"
-        for p in periods
-    ]))
-
-    # Days (standard school days)
-    days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
-
-    # Grid structure: day -> [subjects per time slot]
-    timetable = {day: ['' for _ in time_slots] for day in days}
-
-    for p in periods:
-        time_label = f"{p.start_time.strftime('%H:%M')} - {p.end_time.strftime('%H:%M')}"
-        if time_label in time_slots:
-            col_index = time_slots.index(time_label)
-            timetable[p.day][col_index] = p.subject
+    grid = get_timetable_grid(classroom.id) if classroom else empty_grid()
 
     return render(request, 'portal/student_timetable.html', {
         'class_name': classroom,
-        'time_slots': time_slots,
-        'timetable': timetable,
+        'time_slots': grid['time_slots'],
+        'timetable': grid['timetable'],
         'current_day': current_day
     })
 
@@ -282,7 +282,7 @@ def student_resources(request):
     user_classroom = request.user.classroom
 
     # Only show resources for the logged-in student's class
-    resources = Resource.objects.filter(classroom=user_classroom).order_by('-uploaded_at')
+    resources = Resource.objects.filter(classroom=user_classroom).select_related('created_by').order_by('-uploaded_at')
 
     return render(request, 'portal/student_resources.html', {
         'resources': resources
@@ -298,7 +298,7 @@ def student_announcements(request):
         target_audience__in=['student', 'all']
     ).filter(
         Q(classroom__isnull=True) | Q(classroom=user_classroom)
-    ).order_by('-created_at')
+    ).select_related('classroom').order_by('-created_at')
 
     return render(request, 'portal/student_announcements.html', {
         'announcements': announcements
@@ -347,9 +347,11 @@ def edit_student_profile(request):
 @login_required
 @student_required
 def student_submissions(request):
-    # All submissions for the logged-in student
-    submissions = Submission.objects.filter(student=request.user).order_by('-submitted_at')
-    assignments = Assignment.objects.all().order_by('-due_date')
+    today = timezone.localdate()
+    # Only this class's assignments that are still open can be submitted to
+    assignments = Assignment.objects.filter(
+        classroom=request.user.classroom, classroom__isnull=False, due_date__gte=today
+    ).order_by('due_date')
 
     # Pre-select assignment from GET parameter (from assignments page)
     preselected_assignment_id = request.GET.get('assignment')
@@ -359,11 +361,11 @@ def student_submissions(request):
         uploaded_file = request.FILES.get('file')
         notes = request.POST.get('notes', '').strip()
 
-        # Validate assignment exists
-        assignment = get_object_or_404(Assignment, id=assignment_id)
+        # Validate assignment exists and belongs to the student's class
+        assignment = get_object_or_404(Assignment, id=assignment_id, classroom=request.user.classroom)
 
         # Prevent submission if deadline passed (compare as dates)
-        if assignment.due_date < timezone.now().date():
+        if assignment.due_date < today:
             messages.error(request, f"❌ Submission failed. The deadline for '{assignment.title}' has passed.")
             return redirect('student_submissions')
 
@@ -389,35 +391,16 @@ def student_submissions(request):
 
         return redirect('student_submissions')
 
-    # Attach grade info and calculate percentage/pass-fail
-    for sub in submissions:
-        try:
-            grade = Grade.objects.get(student=request.user, assignment=sub.assignment)
-            sub.grade = grade.score
-            sub.total_marks = grade.total_marks
-            sub.graded = True
-            sub.feedback = grade.feedback
-
-            # Compute percentage and pass/fail
-            if sub.total_marks and sub.total_marks > 0:
-                sub.percentage = round((sub.grade / sub.total_marks) * 100, 2)
-                sub.pass_fail = 'Pass' if sub.percentage >= 50 else 'Fail'
-            else:
-                sub.percentage = None
-                sub.pass_fail = None
-
-        except Grade.DoesNotExist:
-            sub.grade = None
-            sub.total_marks = None
-            sub.graded = False
-            sub.feedback = None
-            sub.percentage = None
-            sub.pass_fail = None
+    # One query per page: grade, percentage and pass/fail come from SQL
+    submissions = Submission.objects.filter(student=request.user).select_related('assignment').with_grades()
+    page = keyset_page(submissions, 'submitted_at', request.GET.get('cursor'))
 
     context = {
-        'submissions': submissions,
+        'submissions': page.items,
+        'page': page,
+        'is_first_page': not request.GET.get('cursor'),
         'assignments': assignments,
-        'now': timezone.now(),
+        'today': today,
         'preselected_assignment_id': preselected_assignment_id,
     }
     return render(request, 'portal/student_submissions.html', context)
@@ -440,64 +423,80 @@ def student_grades_view(request):
         'student_name': student.get_full_name() or student.username,
     })
 
+def _report_card_response(request, student, kind):
+    # ?renderer=reportlab picks the direct ReportLab backend for this download
+    renderer = resolve_renderer(request.GET.get('renderer'))
+
+    # An up-to-date PDF is already in storage: hand it over straight away
+    card_name = report_card_name(student, kind, renderer)
+    if card_name and default_storage.exists(card_name):
+        return _report_card_file_response(student, card_name)
+
+    # Otherwise queue it for the report worker instead of rendering in this request
+    job = enqueue_report_job(student, kind, renderer, requested_by=request.user, card_name=card_name)
+    if request.headers.get('Accept') == 'application/json':
+        return JsonResponse({
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': reverse('report_job_status', args=[job.id]),
+        }, status=202)
+    return redirect('report_job_status', job_id=job.id)
+
+def _report_card_file_response(student, file_name):
+    # Streamed from storage in chunks rather than read into memory
+    return FileResponse(
+        default_storage.open(file_name, 'rb'),
+        as_attachment=True,
+        filename=f"{student.username}_report.pdf",
+        content_type="application/pdf",
+    )
+
 @login_required
 def download_my_grade_report_pdf(request):
-    student = request.user
-    if student.role != 'student':
+    if request.user.role != 'student':
         return HttpResponse("Unauthorized", status=403)
 
-    # Get the latest report
-    report = GradeReport.objects.filter(student=student).order_by('-date_uploaded').first()
-    if not report:
+    student = get_report_student(request.user.pk)
+    if not GradeReport.objects.filter(student=student).exists():
         return HttpResponse("No report available.", status=404)
 
-    grades = report.subject_grades.all()
-    behavioural_skills = report.behavioural_skills.all()
-
-    # Calculate time present/absent if needed, or use a default
-    time_present = getattr(report, 'time_present', '120/0')  # Assuming it's stored in report or calculate
-
-    student_profile = {
-        "profile_id": student.username,
-        "name": student.get_full_name(),
-        "nationality": getattr(student, 'nationality', 'NIGERIA'),
-        "classroom": getattr(student.classroom, 'name', ''),
-        "sex": student.gender,
-        "height": getattr(student, 'height', ''),
-        "weight": getattr(student, 'weight', ''),
-        "time_present": time_present,
-    }
+    return _report_card_response(request, student, LATEST_REPORT)
 
-    # Encode logo as data URI for PDF
-    logo_path = os.path.join(settings.BASE_DIR, 'static', 'portal', 'images', 'logo.png')
-    logo_data_uri = ''
-    if os.path.exists(logo_path):
-        mime_type, _ = mimetypes.guess_type(logo_path)
-        with open(logo_path, "rb") as image_file:
-            encoded_logo = base64.b64encode(image_file.read()).decode('utf-8')
-            logo_data_uri = f"data:{mime_type};base64,{encoded_logo}"
+def _can_view_report_job(user, job):
+    return user.role == 'admin' or job.student_id == user.id
 
-    context = {
-        "student_name": student.get_full_name(),
-        "student_profile": student_profile,
-        "grades": grades,
-        "report": report,
-        "logo_url": logo_data_uri,
-        "behavioural_skills": behavioural_skills,
-    }
+@login_required
+def report_job_status(request, job_id):
+    job = get_object_or_404(ReportJob.objects.select_related('student', 'classroom'), id=job_id)
+    if not _can_view_report_job(request.user, job):
+        return HttpResponseForbidden("You do not have permission to access this page.")
 
-    template_path = "portal/grades_pdf.html"
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = f'attachment; filename="{student.username}_report.pdf"'
+    # The cached PDF was invalidated after the job finished: render it again
+    if job.status == ReportJob.DONE and not default_storage.exists(job.file_name):
+        job = enqueue_again(job, requested_by=request.user)
+        return redirect('report_job_status', job_id=job.id)
 
-    html = render(request, template_path, context).content.decode("UTF-8")
-    result = BytesIO()
-    pisa_status = pisa.CreatePDF(src=html, dest=result)
-    if pisa_status.err:
-        return HttpResponse("Error generating PDF <pre>" + html + "</pre>")
+    if request.GET.get('format') == 'json':
+        data = {'job_id': job.id, 'status': job.status, 'error': job.error}
+        if job.status == ReportJob.DONE:
+            data['download_url'] = reverse('report_job_download', args=[job.id])
+        return JsonResponse(data)
 
-    response.write(result.getvalue())
-    return response
+    if job.status == ReportJob.DONE:
+        return redirect('report_job_download', job_id=job.id)
+
+    return render(request, 'portal/report_job_status.html', {'job': job})
+
+@login_required
+def report_job_download(request, job_id):
+    job = get_object_or_404(ReportJob.objects.select_related('student', 'classroom'), id=job_id, status=ReportJob.DONE)
+    if not _can_view_report_job(request.user, job):
+        return HttpResponseForbidden("You do not have permission to access this page.")
+    if not default_storage.exists(job.file_name):
+        return redirect('report_job_status', job_id=job.id)
+    if job.kind == CLASS_REPORTS:
+        return _class_report_zip_response(job.classroom, job.session, job.term, job.file_name)
+    return _report_card_file_response(job.student, job.file_name)
 
 def register_teacher(request):
     if request.method == 'POST':
@@ -583,7 +582,7 @@ def teacher_dashboard(request):
 @teacher_required
 def teacher_assignments(request):
     user = request.user
-    assignments = Assignment.objects.filter(teacher=user).order_by('-due_date')
+    assignments = Assignment.objects.filter(teacher=user).select_related('classroom').order_by('-due_date')
     classrooms = Classroom.objects.all()
 
     if request.method == 'POST':
@@ -622,11 +621,56 @@ def teacher_assignments(request):
         'classrooms': classrooms
     })
 
+SUBMISSION_STATUSES = [('ungraded', 'Ungraded'), ('graded', 'Graded')]
+
+def _submission_inbox(request, default_status=''):
+    teacher = request.user
+    assignment_id = request.GET.get('assignment', '')
+    classroom_name = request.GET.get('classroom', '')
+    status = request.GET.get('status', default_status)
+
+    submissions = Submission.objects.filter(assignment__teacher=teacher)
+    if assignment_id.isdigit():
+        submissions = submissions.filter(assignment_id=assignment_id)
+    if classroom_name:
+        submissions = submissions.filter(assignment__classroom__name=classroom_name)
+    if status == 'graded':
+        submissions = submissions.filter(graded=True)
+    elif status == 'ungraded':
+        submissions = submissions.filter(graded=False)
+
+    # One joined query per page, however many terms of submissions there are
+    page = keyset_page(
+        submissions.select_related('student', 'assignment', 'assignment__classroom'),
+        'submitted_at', request.GET.get('cursor'),
+    )
+
+    # Filter choices with their ungraded counts, in one grouped query
+    assignments = Assignment.objects.filter(teacher=teacher).select_related('classroom').annotate(
+        submission_count=Count('submission'),
+        ungraded_count=Count('submission', filter=Q(submission__graded=False)),
+    ).order_by('-due_date', '-id')
+
+    filters = {'assignment': assignment_id, 'classroom': classroom_name, 'status': status}
+    filter_query = {name: value for name, value in filters.items() if value}
+    if 'status' in request.GET:
+        # An explicitly empty status means "all"; dropping it would bring back the default
+        filter_query['status'] = status
+    return render(request, 'portal/teacher_submissions.html', {
+        'submissions': page.items,
+        'page': page,
+        'is_first_page': not request.GET.get('cursor'),
+        'assignments': assignments,
+        'classrooms': Classroom.objects.filter(assignment__teacher=teacher).distinct().order_by('name'),
+        'statuses': SUBMISSION_STATUSES,
+        'selected': filters,
+        'filter_query': urlencode(filter_query),
+    })
+
 @login_required
 @teacher_required
 def teacher_submissions(request):
-    submissions = Submission.objects.filter(assignment__teacher=request.user)
-    return render(request, 'portal/teacher_submissions.html', {'submissions': submissions})
+    return _submission_inbox(request)
 
 @login_required
 @teacher_required
@@ -693,7 +737,7 @@ def teacher_resources(request):
         messages.success(request, "Resource uploaded successfully.")
         return redirect('teacher_resources')
 
-    resources = Resource.objects.filter(created_by=request.user).order_by('-created_at')
+    resources = Resource.objects.filter(created_by=request.user).select_related('classroom').order_by('-created_at')
     return render(request, 'portal/teacher_resources.html', {
         'resources': resources,
         'classrooms': classrooms
@@ -759,13 +803,8 @@ def teacher_profile(request):
 @login_required
 @teacher_required
 def teacher_grades(request):
-    teacher = request.user
-    classroom = teacher.classroom
-    assignments = Assignment.objects.filter(teacher=teacher)
-    submissions = Submission.objects.filter(assignment__in=assignments)
-    return render(request, 'portal/teacher_grades.html', {
-        'submissions': submissions,
-    })
+    # The inbox, opened on the submissions already graded
+    return _submission_inbox(request, default_status='graded')
 
 @login_required
 def edit_student_grade(request, grade_id):
@@ -784,12 +823,7 @@ def edit_student_grade(request, grade_id):
         'submission': submission
     })
 
-BEHAVIOURAL_SKILLS = [
-    "Punctuality", "Neatness", "Attentiveness", "Social Development", 
-    "Assignment", "Class Participation", "Perseverance",
-    "Responsibility", "Politeness", "Honesty", "Sport & Games",
-    "Industry", "Club Participation", "Psychomotor"
-]
+BEHAVIOURAL_SKILLS = SKILL_NAMES
 
 @login_required
 @teacher_required
@@ -807,7 +841,7 @@ def teacher_upload_grades(request):
         grade_reports = grade_reports.filter(classroom__name=selected_classroom)
 
     student_grades = {}
-    for report in grade_reports.prefetch_related('subject_grades','behavioural_skills').select_related('student'):
+    for report in grade_reports.prefetch_related('subject_grades').select_related('student'):
         student = report.student
         if student not in student_grades:
             student_grades[student] = []
@@ -847,6 +881,12 @@ def teacher_upload_grades(request):
         student = get_object_or_404(User, username=student_username, role='student')
         classroom = get_object_or_404(Classroom, name=classroom_name)
 
+        try:
+            skill_ratings = parse_ratings(request.POST)
+        except ValueError:
+            messages.error(request, "Behavioural ratings must be between 1 and 5.")
+            return redirect('teacher_upload_grades')
+
         grade_report, created = GradeReport.objects.get_or_create(
             student=student, classroom=classroom, term=term, session=session
         )
@@ -871,11 +911,7 @@ def teacher_upload_grades(request):
         third_term_score = to_int(request.POST.get('third_term_score'))
         average_score = to_float(request.POST.get('average_score'))
 
-        # Overall report fields
-        total_available_score = to_int(request.POST.get('total_available_score'))
-        overall_score = to_int(request.POST.get('overall_score'))
-        overall_average = to_float(request.POST.get('overall_average'))
-        overall_position = request.POST.get('overall_position','').strip()
+        # Overall report fields (totals and position are computed by rank_class)
         teacher_comment = request.POST.get('teacher_comment','').strip()
         admin_comment_report = request.POST.get('admin_comment_report','').strip()
         next_term_date_str = request.POST.get('next_term_date')
@@ -885,14 +921,11 @@ def teacher_upload_grades(request):
             except: pass
 
         # Update GradeReport
-        if total_available_score is not None: grade_report.total_available_score = total_available_score
-        if overall_score is not None: grade_report.overall_score = overall_score
-        if overall_average is not None: grade_report.overall_average = overall_average
-        if overall_position: grade_report.overall_position = overall_position
         if teacher_comment: grade_report.teacher_comment = teacher_comment
         grade_report.admin_comment_report = admin_comment_report
         grade_report.date_uploaded = timezone.now()
         if next_term_date: grade_report.next_term_date = next_term_date
+        grade_report.set_ratings(skill_ratings)
         grade_report.save()
 
         # Create or update SubjectGrade
@@ -918,17 +951,7 @@ def teacher_upload_grades(request):
             grade.average_score = average_score
             grade.save()
 
-        # Behavioural skills
-        for skill in BEHAVIOURAL_SKILLS:
-            key_name = f'beh_{skill.replace(" ","_")}'
-            rating = request.POST.get(key_name)
-            if rating:
-                BehaviouralSkill.objects.update_or_create(
-                    student=student,
-                    report=grade_report,
-                    skill_name=skill,
-                    defaults={'rating': int(rating)}
-                )
+        rank_class(classroom, session, term)
 
         messages.success(request,"Grades uploaded successfully.")
         return redirect('teacher_upload_grades')
@@ -943,6 +966,212 @@ def teacher_upload_grades(request):
         'search': search
     })
 
+@login_required
+@teacher_required
+def teacher_import_grades(request):
+    result = None
+    if request.method == 'POST':
+        uploaded = request.FILES.get('file')
+        if not uploaded:
+            messages.error(request, "Please choose a CSV or XLSX file.")
+            return redirect('teacher_import_grades')
+        try:
+            rows = read_rows(uploaded, uploaded.name)
+            result = import_grades(rows, dry_run=bool(request.POST.get('dry_run')))
+        except GradeImportError as e:
+            messages.error(request, str(e))
+            return redirect('teacher_import_grades')
+
+        if result.ok and not result.dry_run:
+            messages.success(
+                request,
+                f"Imported {result.rows} row(s): {result.created} grade(s) added, {result.updated} updated, "
+                f"{result.unchanged} unchanged."
+            )
+            return redirect('teacher_upload_grades')
+
+    return render(request, 'portal/teacher_import_grades.html', {
+        'result': result,
+        'required_columns': REQUIRED_COLUMNS,
+        'optional_columns': OPTIONAL_COLUMNS,
+    })
+
+GRID_FIELDS = ['first_test', 'second_test', 'exam']
+GRID_CELL = re.compile(r'^cell-(\d+)-(\d+)-(first_test|second_test|exam)$')
+
+@login_required
+@teacher_required
+def teacher_grade_grid(request):
+    params = request.POST if request.method == 'POST' else request.GET
+    classroom_name = params.get('classroom')
+    session = params.get('session')
+    term = params.get('term')
+    context = {
+        'classrooms': Classroom.objects.order_by('name'),
+        'session_choices': GradeReport.SESSION_CHOICES,
+        'term_choices': GradeReport.TERM_CHOICES,
+        'selected_session': session,
+        'selected_term': term,
+        'grid_fields': GRID_FIELDS,
+    }
+    if not (classroom_name and session and term):
+        return render(request, 'portal/teacher_grade_grid.html', context)
+
+    classroom = get_object_or_404(Classroom, name=classroom_name)
+    students = list(User.objects.filter(role='student', classroom=classroom).order_by('first_name', 'last_name', 'username'))
+    students_by_id = {student.id: student for student in students}
+
+    # Every existing score for the class and term, in one query
+    scores = {}
+    for student_id, subject, *values in SubjectGrade.objects.filter(
+        report__classroom=classroom, report__session=session, report__term=term, report__student__in=students
+    ).values_list('report__student_id', 'subject', *GRID_FIELDS):
+        scores.setdefault((student_id, subject), dict(zip(GRID_FIELDS, values)))
+
+    if request.method == 'POST':
+        subjects = request.POST.getlist('subject')
+    else:
+        subjects = sorted({subject for _, subject in scores})
+        for subject in request.GET.get('add_subject', '').split(','):
+            if subject.strip() and subject.strip() not in subjects:
+                subjects.append(subject.strip())
+
+    posted = {}
+    if request.method == 'POST':
+        # Only edited cells are posted; group them into one row per grade
+        rows = {}
+        for name, value in request.POST.items():
+            match = GRID_CELL.match(name)
+            if not match:
+                continue
+            student = students_by_id.get(int(match.group(1)))
+            index = int(match.group(2))
+            if student is None or index >= len(subjects):
+                continue
+            row = rows.setdefault((student, subjects[index]), {
+                'username': student.username, 'classroom': classroom.name,
+                'session': session, 'term': term, 'subject': subjects[index],
+            })
+            row[match.group(3)] = value.strip()
+            posted[(student.id, subjects[index], match.group(3))] = value.strip()
+
+        result = import_grades(
+            [(f"{student.get_full_name() or student.username} – {subject}", row) for (student, subject), row in rows.items()]
+        )
+        if result.ok:
+            messages.success(request, f"Saved: {result.created} grade(s) added, {result.updated} updated.")
+            query = urlencode({'classroom': classroom.name, 'session': session, 'term': term})
+            return redirect(f"{reverse('teacher_grade_grid')}?{query}")
+        context['errors'] = result.errors
+
+    grid = []
+    for student in students:
+        cells = []
+        for index, subject in enumerate(subjects):
+            saved = scores.get((student.id, subject), {})
+            cells.append([
+                {
+                    'name': f'cell-{student.id}-{index}-{field}',
+                    'original': '' if saved.get(field) is None else saved[field],
+                    'value': posted.get((student.id, subject, field), saved.get(field, '')),
+                    'max': getattr(SubjectGrade, f'MAX_{field.upper()}'),
+                }
+                for field in GRID_FIELDS
+            ])
+        grid.append((student, cells))
+
+    context.update({
+        'selected_classroom': classroom,
+        'subjects': subjects,
+        'grid': grid,
+    })
+    return render(request, 'portal/teacher_grade_grid.html', context)
+
+SKILL_CELL = re.compile(r'^rating-(\d+)-(\d+)$')
+
+@login_required
+@teacher_required
+def teacher_behavioural_matrix(request):
+    params = request.POST if request.method == 'POST' else request.GET
+    classroom_name = params.get('classroom')
+    session = params.get('session')
+    term = params.get('term')
+    context = {
+        'classrooms': Classroom.objects.order_by('name'),
+        'session_choices': GradeReport.SESSION_CHOICES,
+        'term_choices': GradeReport.TERM_CHOICES,
+        'selected_session': session,
+        'selected_term': term,
+        'skills': SKILL_NAMES,
+    }
+    if not (classroom_name and session and term):
+        return render(request, 'portal/teacher_behavioural_matrix.html', context)
+
+    classroom = get_object_or_404(Classroom, name=classroom_name)
+    students = list(User.objects.filter(role='student', classroom=classroom).order_by('first_name', 'last_name', 'username'))
+    students_by_id = {student.id: student for student in students}
+    reports = {}
+    for report in GradeReport.objects.filter(
+        classroom=classroom, session=session, term=term, student__in=students
+    ).order_by('-id'):
+        reports[report.student_id] = report  # oldest wins if a term was created twice
+
+    posted = {}
+    if request.method == 'POST':
+        # Only edited cells are posted (see the template's submit handler)
+        updates, errors = {}, []
+        for name, value in request.POST.items():
+            match = SKILL_CELL.match(name)
+            if not match:
+                continue
+            student = students_by_id.get(int(match.group(1)))
+            index = int(match.group(2))
+            if student is None or index >= len(SKILL_NAMES):
+                continue
+            skill = SKILL_NAMES[index]
+            posted[(student.id, skill)] = value
+            try:
+                rating = parse_rating(value)
+            except ValueError:
+                errors.append(f"{student.get_full_name() or student.username} – {skill}: '{value}' is not 1 to 5.")
+                continue
+            if rating is not None:
+                updates[(student.id, skill)] = rating
+
+        if not errors:
+            with transaction.atomic():
+                missing = {student_id for student_id, _ in updates if student_id not in reports}
+                for report in GradeReport.objects.bulk_create([
+                    GradeReport(student_id=student_id, classroom=classroom, session=session, term=term)
+                    for student_id in missing
+                ]):
+                    reports[report.student_id] = report
+                saved = save_ratings([
+                    (reports[student_id].id, skill, rating)
+                    for (student_id, skill), rating in updates.items()
+                ])
+            messages.success(request, f"Saved {saved} behavioural rating(s).")
+            query = urlencode({'classroom': classroom.name, 'session': session, 'term': term})
+            return redirect(f"{reverse('teacher_behavioural_matrix')}?{query}")
+        context['errors'] = errors
+
+    matrix = []
+    for student in students:
+        report = reports.get(student.id)
+        ratings = report.ratings if report else {}
+        cells = []
+        for index, skill in enumerate(SKILL_NAMES):
+            saved = ratings.get(skill)
+            cells.append({
+                'name': f'rating-{student.id}-{index}',
+                'original': '' if saved is None else saved,
+                'value': posted.get((student.id, skill), '' if saved is None else saved),
+            })
+        matrix.append((student, cells))
+
+    context.update({'selected_classroom': classroom, 'matrix': matrix})
+    return render(request, 'portal/teacher_behavioural_matrix.html', context)
+
 @login_required
 def edit_grade(request, grade_id):
     grade = get_object_or_404(SubjectGrade, id=grade_id)
@@ -953,11 +1182,9 @@ def edit_grade(request, grade_id):
             self.name = name
             self.rating = rating
 
-    # Prepare existing behavioural skill ratings
-    skills_list = []
-    for skill in BEHAVIOURAL_SKILLS:
-        existing = report.behavioural_skills.filter(skill_name=skill).first()
-        skills_list.append(SkillRating(skill, existing.rating if existing else None))
+    # Prepare existing behavioural skill ratings (stored on the report itself)
+    ratings = report.ratings
+    skills_list = [SkillRating(skill, ratings.get(skill)) for skill in BEHAVIOURAL_SKILLS]
 
     def parse_int(value, current):
         try:
@@ -972,6 +1199,12 @@ def edit_grade(request, grade_id):
             return current
 
     if request.method == 'POST':
+        try:
+            skill_ratings = parse_ratings(request.POST)
+        except ValueError:
+            messages.error(request, "Behavioural ratings must be between 1 and 5.")
+            return redirect(request.path)
+
         # --- SUBJECT GRADE updates ---
         grade.subject = request.POST.get('subject', grade.subject).strip() or grade.subject
         grade.first_test = parse_int(request.POST.get('first_test'), grade.first_test)
@@ -984,15 +1217,9 @@ def edit_grade(request, grade_id):
         grade.second_term_score = parse_int(request.POST.get('second_term_score'), grade.second_term_score)
         grade.third_term_score = parse_int(request.POST.get('third_term_score'), grade.third_term_score)
         grade.average_score = parse_float(request.POST.get('average_score'), grade.average_score)
-        grade.term = request.POST.get('term') or grade.term
-        grade.session = request.POST.get('session') or grade.session
         grade.save()
 
         # --- REPORT updates ---
-        report.total_available_score = parse_int(request.POST.get('total_available_score'), report.total_available_score)
-        report.overall_score = parse_int(request.POST.get('overall_score'), report.overall_score)
-        report.overall_average = parse_float(request.POST.get('overall_average'), report.overall_average)
-        report.overall_position = request.POST.get('overall_position', report.overall_position).strip()
         report.teacher_comment = request.POST.get('teacher_comment', report.teacher_comment).strip()
         report.admin_comment_report = request.POST.get('admin_comment_report', report.admin_comment_report).strip()
 
@@ -1004,19 +1231,12 @@ def edit_grade(request, grade_id):
                 pass
 
         report.date_uploaded = timezone.now()
-        report.save()
 
         # --- BEHAVIOURAL SKILLS updates ---
-        for skill_obj in skills_list:
-            key_name = f'beh_{skill_obj.name.replace(" ", "_")}'
-            rating = request.POST.get(key_name)
-            if rating:
-                BehaviouralSkill.objects.update_or_create(
-                    student=report.student,
-                    report=report,
-                    skill_name=skill_obj.name,
-                    defaults={'rating': int(rating)}
-                )
+        report.set_ratings(skill_ratings)
+        report.save()
+
+        rank_class(report.classroom, report.session, report.term)
 
         messages.success(request, "Grade and comments updated successfully.")
 
@@ -1097,7 +1317,7 @@ def create_announcement(request):
 @login_required
 @user_passes_test(is_admin)
 def manage_announcements(request):
-    announcements = Announcement.objects.all().order_by('-created_at')
+    announcements = Announcement.objects.select_related('classroom').order_by('-created_at')
     return render(request, 'portal/manage_announcements.html', {'announcements': announcements})
 
 @login_required
@@ -1126,7 +1346,7 @@ def delete_announcement(request, announcement_id):
 @login_required
 @user_passes_test(is_admin)
 def admin_resources(request):
-    resources = Resource.objects.all().order_by('-created_at')
+    resources = Resource.objects.select_related('created_by').order_by('-created_at')
     return render(request, 'portal/admin_resources.html', {'resources': resources})
 
 @login_required
@@ -1202,45 +1422,19 @@ def manage_timetables(request):
     classrooms = Classroom.objects.all()
     selected_class = request.GET.get('classroom')
 
-    if selected_class:
-        timetable_qs = Timetable.objects.filter(classroom__name=selected_class)
-    else:
-        timetable_qs = Timetable.objects.all()
-
-    timetable_data = {}
-    days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+    shown = [c for c in classrooms if not selected_class or c.name == selected_class]
+    grids = get_timetable_grids(c.id for c in shown)
 
-    # Group by classroom
-    for classroom in classrooms:
-        periods = timetable_qs.filter(classroom=classroom).order_by('day', 'start_time')
-        if not periods:
-            continue
-
-        # Build time slots
-        time_slots = sorted(set(
-            f"{p.start_time.strftime('%H:%M')} - {p.end_time.strftime('%H:%M')}"
-            for p in periods
-        ))
-
-        # Initialize empty grid
-        grid = {day: ['' for _ in time_slots] for day in days}
-
-        for p in periods:
-            slot_label = f"{p.start_time.strftime('%H:%M')} - {p.end_time.strftime('%H:%M')}"
-            if slot_label in time_slots:
-                index = time_slots.index(slot_label)
-                grid[p.day][index] = f"{p.subject}<br><small>{p.teacher.get_full_name}</small>"
-
-        timetable_data[classroom.name] = {
-            'time_slots': time_slots,
-            'timetable': grid
-        }
+    # Classrooms without any periods are left off the page
+    timetable_data = {
+        c.name: grids[c.id] for c in shown if grids[c.id]['time_slots']
+    }
 
     return render(request, 'portal/admin_timetables.html', {
         'classrooms': classrooms,
         'selected_class': selected_class,
         'timetable_data': timetable_data,
-        'days': days,
+        'days': DAYS,
         'current_day': now().strftime("%A")
     })
 
@@ -1255,17 +1449,26 @@ def add_timetable_period(request):
         end_time = request.POST.get('end_time')
         teacher_username = request.POST.get('teacher')
 
-        classroom = get_object_or_404(Classroom, name=classroom_name)
-        teacher = get_object_or_404(User, username=teacher_username, role='teacher')
-
-        Timetable.objects.create(
-            classroom=classroom,
-            subject=subject,
-            day=day,
-            start_time=start_time,
-            end_time=end_time,
-            teacher=teacher
-        )
+        with transaction.atomic():
+            # Locking the class and teacher stops two clashing periods being added at once
+            classroom = get_object_or_404(Classroom.objects.select_for_update(), name=classroom_name)
+            teacher = get_object_or_404(User.objects.select_for_update(), username=teacher_username, role='teacher')
+
+            period = Timetable(
+                classroom=classroom,
+                subject=subject,
+                day=day,
+                start_time=start_time,
+                end_time=end_time,
+                teacher=teacher
+            )
+            try:
+                period.full_clean()
+            except ValidationError as e:
+                for error in e.messages:
+                    messages.error(request, error)
+                return redirect('add_timetable_period')
+            period.save()
         messages.success(request, 'Timetable period added successfully.')
         return redirect('manage_timetables')
 
@@ -1276,6 +1479,67 @@ def add_timetable_period(request):
         'teachers': teachers
     })
 
+def _filter_grades(grades, params):
+    # Shared by the grades list and its CSV export
+    student_query = params.get('student')
+    term_query = params.get('term')
+    session_query = params.get('session')
+
+    if student_query:
+        grades = grades.filter(
+            Q(report__student__first_name__icontains=student_query) |
+            Q(report__student__last_name__icontains=student_query) |
+            Q(report__student__username__icontains=student_query)
+        )
+    if term_query:
+        grades = grades.filter(report__term=term_query)
+    if session_query:
+        grades = grades.filter(report__session__icontains=session_query)
+
+    return grades.order_by('report__student__last_name', 'report__student__first_name', 'subject')
+
+GRADE_EXPORT_COLUMNS = [
+    ('Username', 'report__student__username'),
+    ('First Name', 'report__student__first_name'),
+    ('Last Name', 'report__student__last_name'),
+    ('Classroom', 'report__classroom__name'),
+    ('Session', 'report__session'),
+    ('Term', 'report__term'),
+    ('Subject', 'subject'),
+    ('1st Test', 'first_test'),
+    ('2nd Test', 'second_test'),
+    ('Exam', 'exam'),
+    ('Total', 'total'),
+    ('Grade', 'letter_grade'),
+    ('1st Term', 'first_term_score'),
+    ('2nd Term', 'second_term_score'),
+    ('3rd Term', 'third_term_score'),
+    ('Average', 'average_score'),
+    ('Comment', 'grade_comment'),
+]
+
+class _Echo:
+    # csv.writer target that hands each formatted line straight back
+    def write(self, value):
+        return value
+
+@login_required
+@user_passes_test(is_admin)
+def admin_export_grades_csv(request):
+    grades = _filter_grades(SubjectGrade.objects.with_grade(), request.GET)
+    rows = grades.values_list(*[field for _, field in GRADE_EXPORT_COLUMNS]).iterator(chunk_size=2000)
+
+    def stream():
+        writer = csv.writer(_Echo())
+        # The header goes out before the query runs
+        yield writer.writerow([label for label, _ in GRADE_EXPORT_COLUMNS])
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(stream(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="grades_{timezone.localdate():%Y%m%d}.csv"'
+    return response
+
 @login_required
 @user_passes_test(is_admin)
 def admin_manage_grades(request):
@@ -1310,28 +1574,16 @@ def admin_manage_grades(request):
 
     else:
         # All grades (filterable list)
-        grades = SubjectGrade.objects.select_related('report__student', 'report').all()
-
-        student_query = request.GET.get('student')
-        term_query = request.GET.get('term')
-        session_query = request.GET.get('session')
-
-        if student_query:
-            grades = grades.filter(
-                Q(report__student__first_name__icontains=student_query) |
-                Q(report__student__last_name__icontains=student_query) |
-                Q(report__student__username__icontains=student_query)
-            )
-        if term_query:
-            grades = grades.filter(report__term=term_query)
-        if session_query:
-            grades = grades.filter(report__session__icontains=session_query)
-
-        grades = grades.order_by('report__student__last_name', 'report__student__first_name', 'subject')
+        grades = _filter_grades(
+            SubjectGrade.objects.select_related('report__student', 'report'), request.GET
+        )
 
         return render(request, 'portal/admin_manage_grades.html', {
             'grades_list': grades,
             'students': students,
+            'classrooms': Classroom.objects.all(),
+            'session_choices': GradeReport.SESSION_CHOICES,
+            'term_choices': GradeReport.TERM_CHOICES,
         })
 
 @login_required
@@ -1368,74 +1620,91 @@ def delete_student_grade(request, grade_id):
 @user_passes_test(is_admin)
 def admin_download_grade_report_pdf(request, student_id):
     # Get the student object
-    student = User.objects.filter(id=student_id, role='student').first()
+    student = get_report_student(student_id)
     if not student:
         return HttpResponse("Student not found.", status=404)
 
-    # Get all reports and related subject grades for this student
-    reports = GradeReport.objects.filter(student=student)
-    grades = SubjectGrade.objects.filter(report__in=reports).order_by('report__term', 'subject')
-
-    latest_report = reports.order_by('-date_uploaded').first()
-
-    if not latest_report:
+    if not GradeReport.objects.filter(student=student).exists():
         return HttpResponse("No report found.", status=404)
 
-    # Calculate time present/absent if needed, or use a default
-    time_present = getattr(latest_report, 'time_present', '120/0')  # Assuming it's stored in report or calculate
-
-    student_profile = {
-        "profile_id": student.username,
-        "name": student.get_full_name() or student.username,
-        "nationality": getattr(student, 'nationality', 'NIGERIA'),
-        "classroom": getattr(student.classroom, 'name', 'Not Assigned'),
-        "sex": student.gender or 'Not Specified',
-        "height": str(getattr(student, 'height', 'N/A')),
-        "weight": str(getattr(student, 'weight', 'N/A')),
-        "time_present": time_present,
-    }
-
-    behavioural_skills = latest_report.behavioural_skills.all()
-
-    # Encode logo for PDF header
-    logo_path = os.path.join(settings.BASE_DIR, 'static', 'portal', 'images', 'logo.jpg')
-    logo_data_uri = ''
-    if os.path.exists(logo_path):
-        mime_type, _ = mimetypes.guess_type(logo_path)
-        with open(logo_path, "rb") as image_file:
-            encoded_logo = base64.b64encode(image_file.read()).decode('utf-8')
-            logo_data_uri = f"data:{mime_type};base64,{encoded_logo}"
+    return _report_card_response(request, student, ALL_REPORTS)
 
-    context = {
-        'grades': grades,
-        'reports': reports,
-        'report': latest_report,
-        'student_name': student.get_full_name() or student.username,
-        'student_profile': student_profile,
-        'behavioural_skills': behavioural_skills,
-        'logo_url': logo_data_uri,
-    }
-
-    template = get_template('portal/grades_pdf.html')
-    html = template.render(context)
-
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{student.username}_report.pdf"'
-
-    from io import BytesIO
-    result = BytesIO()
-    pisa_status = pisa.CreatePDF(html, dest=result)
+@login_required
+@user_passes_test(is_admin)
+def admin_download_class_report_cards(request):
+    classroom = get_object_or_404(Classroom, name=request.GET.get('classroom'))
+    session = request.GET.get('session')
+    term = request.GET.get('term')
+
+    if not session or not term:
+        messages.error(request, "Please select a session and term.")
+        return redirect('admin_manage_grades')
+
+    # An up-to-date ZIP is already in storage: hand it over straight away
+    renderer = resolve_renderer(request.GET.get('renderer'))
+    zip_name = class_report_zip_name(classroom, session, term, renderer)
+    if zip_name is None:
+        messages.error(request, f"There are no report cards for {classroom.name} {session} {term}.")
+        return redirect('admin_manage_grades')
+    if default_storage.exists(zip_name):
+        return _class_report_zip_response(classroom, session, term, zip_name)
+
+    # Otherwise the report worker renders the whole class, never this request
+    job = enqueue_class_report_job(classroom, session, term, renderer, requested_by=request.user, card_name=zip_name)
+    return redirect('report_job_status', job_id=job.id)
+
+def _class_report_zip_response(classroom, session, term, file_name):
+    return FileResponse(
+        default_storage.open(file_name, 'rb'),
+        as_attachment=True,
+        filename=f"{slugify(f'{classroom.name} {session} {term}')}_report_cards.zip",
+        content_type='application/zip',
+    )
 
-    if pisa_status.err:
-        return HttpResponse('Error generating PDF. <pre>' + html + '</pre>')
+@login_required
+@user_passes_test(is_admin)
+def admin_class_statistics(request):
+    classrooms = Classroom.objects.order_by('name')
+    classroom = None
+    session = request.GET.get('session')
+    term = request.GET.get('term')
+    stats = None
+
+    if request.GET.get('classroom'):
+        classroom = get_object_or_404(Classroom, name=request.GET.get('classroom'))
+        if session and term:
+            stats = get_class_stats(classroom.id, session, term)
+
+    return render(request, 'portal/admin_class_statistics.html', {
+        'classrooms': classrooms,
+        'session_choices': GradeReport.SESSION_CHOICES,
+        'term_choices': GradeReport.TERM_CHOICES,
+        'selected_classroom': classroom,
+        'selected_session': session,
+        'selected_term': term,
+        'stats': stats,
+    })
 
-    response.write(result.getvalue())
-    return response
+@login_required
+@user_passes_test(is_admin)
+def admin_carry_forward_scores(request):
+    if request.method != 'POST':
+        return redirect('admin_manage_grades')
+
+    classroom = get_object_or_404(Classroom, name=request.POST.get('classroom'))
+    session = request.POST.get('session')
+    if not session:
+        messages.error(request, "Please select a session.")
+        return redirect('admin_manage_grades')
+
+    updated = carry_forward_scores(session, classroom)
+    messages.success(request, f"Term scores carried forward for {classroom.name} {session}: {updated} subject grade(s) updated.")
+    return redirect('admin_manage_grades')
 
 # ---- Upload First Test ----
 @login_required
 def first_test_upload(request):
-    students = User.objects.filter(role='student').order_by('first_name')
+    students = User.objects.filter(role='student').select_related('classroom').order_by('first_name')
     classrooms = Classroom.objects.all()
 
     if request.method == "POST":
@@ -1514,11 +1783,71 @@ def first_test_upload(request):
     })
 
 
+# ---- Batch Upload First Test ----
+@login_required
+def first_test_batch_upload(request):
+    # Shared by the teacher and admin dashboards
+    if request.user.role not in ('teacher', 'admin'):
+        return HttpResponseForbidden("You do not have permission to access this page.")
+    params = request.POST if request.method == 'POST' else request.GET
+    classroom_name = params.get('classroom')
+    session = params.get('session')
+    term = params.get('term')
+    subject = params.get('subject', '').strip()
+    context = {
+        'classrooms': Classroom.objects.order_by('name'),
+        'session_choices': GradeReport.SESSION_CHOICES,
+        'term_choices': GradeReport.TERM_CHOICES,
+        'selected_session': session,
+        'selected_term': term,
+        'subject': subject,
+        'max_score': SubjectGrade.MAX_FIRST_TEST,
+    }
+    if not (classroom_name and session and term and subject):
+        return render(request, 'portal/first_test_batch_upload.html', context)
+
+    classroom = get_object_or_404(Classroom, name=classroom_name)
+    students = list(User.objects.filter(role='student', classroom=classroom).order_by('first_name', 'last_name', 'username'))
+    current = dict(SubjectGrade.objects.filter(
+        report__classroom=classroom, report__session=session, report__term=term,
+        report__student__in=students, subject=subject,
+    ).values_list('report__student_id', 'first_test'))
+
+    posted = {}
+    if request.method == 'POST':
+        rows = []
+        for student in students:
+            score = request.POST.get(f'score-{student.id}', '').strip()
+            if not score:
+                continue
+            posted[student.id] = score
+            rows.append((student.get_full_name() or student.username, {
+                'username': student.username, 'classroom': classroom.name, 'session': session,
+                'term': term, 'subject': subject, 'first_test': score,
+            }))
+
+        result = import_grades(rows)
+        if result.ok:
+            messages.success(
+                request,
+                f"First test for {subject} saved: {result.created} added, {result.updated} updated, {result.unchanged} unchanged."
+            )
+            query = urlencode({'classroom': classroom.name, 'session': session, 'term': term, 'subject': subject})
+            return redirect(f"{request.path}?{query}")
+        context['errors'] = result.errors
+
+    context.update({
+        'selected_classroom': classroom,
+        'rows': [(student, posted.get(student.id, current.get(student.id, ''))) for student in students],
+    })
+    return render(request, 'portal/first_test_batch_upload.html', context)
+
+
 # ---- Edit First Test ----
 @login_required
 def first_test_edit(request, grade_id):
     grade = get_object_or_404(SubjectGrade, id=grade_id)
-    students = User.objects.filter(role='student').order_by('first_name')
+    students = User.objects.filter(role='student').select_related('classroom').order_by('first_name')
 
     if request.method == "POST":
         student_id = request.POST.get("student_id")
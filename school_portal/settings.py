@@ -85,6 +85,19 @@ DATABASES = {
     )
 }
 
+# -------------------------------------------------
+# CACHE (shared by every web worker, the report worker and commands)
+# -------------------------------------------------
+# Timetable grids and class statistics are invalidated on save; a per-process
+# cache would only forget them in the process that made the change. The
+# table is created by migration 0012 (or `manage.py createcachetable`).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'portal_cache',
+    }
+}
+
 # -------------------------------------------------
 # PASSWORD VALIDATION
 # -------------------------------------------------
@@ -153,6 +166,16 @@ SECURE_HSTS_INCLUDE_SUBDOMAINS = True
 SECURE_HSTS_PRELOAD = True
 SECURE_SSL_REDIRECT = not DEBUG
 
+# -------------------------------------------------
+# REPORT CARDS
+# -------------------------------------------------
+# 'xhtml2pdf' renders grades_pdf.html, 'reportlab' draws the same layout directly
+REPORT_CARD_RENDERER = os.environ.get('REPORT_CARD_RENDERER', 'xhtml2pdf')
+# PDFs bigger than this spill from memory to a temp file while rendering
+REPORT_CARD_SPOOL_MAX_SIZE = 1024 * 1024
+# Seconds a report job may run before a worker treats its owner as dead and requeues it
+REPORT_JOB_TIMEOUT = 10 * 60
+
 # -------------------------------------------------
 # CUSTOM USER MODEL
 # -------------------------------------------------